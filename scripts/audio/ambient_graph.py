@@ -0,0 +1,428 @@
+"""Synth graphs for the ambient stem generator.
+
+Synths are data: each one in ambient_profiles.json is a list of nodes
+(sources, filters, modulators, mixes) with their parameters, evaluated in
+the order written. The last node is the synth's output:
+
+  {"id": "noise", "type": "brown_noise"},
+  {"id": "swept", "type": "sweep", "input": "noise", "base_cutoff": 120,
+   "sweep_range": 60, "lfo_rate": "0.03 + uniform(0, 0.02)"},
+  {"id": "out", "type": "lowpass", "input": "swept", "cutoff": 200}
+
+A parameter is a number or an expression over numbers, + - * /, pi, the
+synth's "vars" and uniform(low, high), a draw from the stem's rng. Vars,
+then nodes and each node's parameters, draw in the order written, and
+noise sources take their samples from the same rng, so reordering nodes
+changes a stem even when the graph means the same thing.
+
+A node's output is handed to the node that reads it, which works on it in
+place; one read by several nodes is rendered once and copied for each. A
+node that doesn't depend on the stem's rng (no draws, or a "seed" of its
+own, and only such inputs) is pure: its output can be kept in a NodeCache
+and shared by every variant and synth containing the same node, e.g. a
+seeded noise bed under two layers is synthesized once per length and dtype.
+
+This module parses, validates and evaluates graphs. What each node type
+renders is up to the caller: generate_ambient_stems.py passes its
+NODE_TYPES, and renders through render_graph() with its own cache and
+streaming state.
+"""
+
+from __future__ import annotations
+
+import ast
+import hashlib
+import json
+import math
+import operator
+from collections import Counter, OrderedDict
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+PROFILES_VERSION = 1
+
+
+class NodeType(NamedTuple):
+    render: Callable[..., np.ndarray]  # render(n, rng, inputs, **params)
+    inputs: tuple[int, int | None]  # (min, max) inputs; "input" if max is 1, else "inputs"
+    required: tuple[str, ...]
+    defaults: dict[str, object]
+    random: bool  # draws from rng while rendering (noise, sweep phase)
+
+
+# ── Expressions ──────────────────────────────────────────────────────
+
+_BINARY_OPS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv}
+_UNARY_OPS = {ast.USub: operator.neg, ast.UAdd: operator.pos}
+_CONSTANTS = {"pi": math.pi}
+
+
+class Expr(NamedTuple):
+    """A parsed parameter expression."""
+    tree: ast.expr
+    names: frozenset[str]  # vars it reads
+    random: bool  # calls uniform()
+
+
+def _compile_expr(text: str, names: set[str], where: str) -> Expr:
+    try:
+        tree = ast.parse(text, mode="eval").body
+    except SyntaxError:
+        raise ValueError(f"{where}: can't parse {text!r}") from None
+    used: set[str] = set()
+    random = False
+
+    def check(node: ast.expr) -> None:
+        nonlocal random
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            return
+        if isinstance(node, ast.Name) and (node.id in names or node.id in _CONSTANTS):
+            if node.id not in _CONSTANTS:
+                used.add(node.id)
+            return
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+            check(node.left)
+            check(node.right)
+            return
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+            check(node.operand)
+            return
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "uniform"
+                and len(node.args) == 2 and not node.keywords):
+            random = True
+            for arg in node.args:
+                check(arg)
+            return
+        if isinstance(node, ast.Name):
+            raise ValueError(f"{where}: {text!r}: unknown name {node.id!r}")
+        raise ValueError(f"{where}: {text!r}: only numbers, + - * /, pi, vars and "
+                         f"uniform(low, high) are allowed")
+
+    check(tree)
+    return Expr(tree, frozenset(used), random)
+
+
+def _evaluate(node: ast.expr, env: dict[str, float], rng) -> float:
+    """Value of a checked expression; operands left to right, like Python."""
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.Name):
+        return env[node.id]
+    if isinstance(node, ast.BinOp):
+        left = _evaluate(node.left, env, rng)
+        return _BINARY_OPS[type(node.op)](left, _evaluate(node.right, env, rng))
+    if isinstance(node, ast.UnaryOp):
+        return _UNARY_OPS[type(node.op)](_evaluate(node.operand, env, rng))
+    low = _evaluate(node.args[0], env, rng)
+    return rng.uniform(low, _evaluate(node.args[1], env, rng))
+
+
+def _parse_value(value, names: set[str], where: str):
+    """A parameter as written: numbers stay, strings become Exprs, lists recurse."""
+    if isinstance(value, str):
+        return _compile_expr(value, names, where)
+    if isinstance(value, list):
+        return [_parse_value(v, names, where) for v in value]
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if not math.isfinite(value):
+            raise ValueError(f"{where}: {value!r} is not a finite number")
+        return value
+    raise ValueError(f"{where}: expected a number, expression or list, got {value!r}")
+
+
+def _resolve(value, env: dict[str, float], rng):
+    if isinstance(value, Expr):
+        return _evaluate(value.tree, env, rng)
+    if isinstance(value, list):
+        return [_resolve(v, env, rng) for v in value]
+    return value
+
+
+def _exprs(value):
+    if isinstance(value, Expr):
+        yield value
+    elif isinstance(value, list):
+        for v in value:
+            yield from _exprs(v)
+
+
+def _check_params(node_type: str, params: dict, n_inputs: int, sample_rate: int, where: str) -> None:
+    """Reject parameter values no render could use.
+
+    Runs on the values as written when a graph is loaded, where expressions
+    (not drawn yet) pass, and again on the drawn values at render time.
+    """
+    def known(value) -> bool:
+        return not isinstance(value, Expr)
+
+    for name, value in params.items():
+        for leaf in _leaves(value):
+            if known(leaf) and not math.isfinite(leaf):
+                raise ValueError(f"{where}: {name} {leaf!r} is not a finite number")
+
+    nyquist = sample_rate / 2
+    for name in ("cutoff", "low", "high"):
+        value = params.get(name)
+        if name in params and known(value) and not 0 < value < nyquist:
+            raise ValueError(f"{where}: {name} {value!r} Hz is outside 0 < f < {nyquist:g} Hz")
+    if node_type == "bandpass" and known(params["low"]) and known(params["high"]) \
+            and params["low"] >= params["high"]:
+        raise ValueError(f"{where}: low {params['low']!r} Hz is not below high {params['high']!r} Hz")
+    order = params.get("order")
+    if "order" in params and known(order) and (type(order) is not int or order < 1):
+        raise ValueError(f"{where}: order {order!r} is not a positive integer")
+
+    if node_type == "oscillators":
+        partials = params["partials"]
+        if not isinstance(partials, list) or not partials or not all(
+                isinstance(p, list) and len(p) in (2, 3) for p in partials):
+            raise ValueError(f"{where}: partials must be a non-empty list of [freq, phase, gain] "
+                             f"or [freq, gain] lists, got {partials!r}")
+        for entry in partials:
+            # Values are numbers, Exprs or lists by now; only lists are wrong.
+            if any(isinstance(v, list) for v in entry):
+                raise ValueError(f"{where}: partial {entry!r} must hold numbers or "
+                                 f"expressions, not lists")
+    if node_type == "mix" and params["gains"] is not None:
+        gains = params["gains"]
+        if not isinstance(gains, list) or len(gains) != n_inputs:
+            raise ValueError(f"{where}: gains must be a list of one gain per input "
+                             f"({n_inputs}), got {gains!r}")
+
+
+def _leaves(value):
+    if isinstance(value, list):
+        for v in value:
+            yield from _leaves(v)
+    elif value is not None:
+        yield value
+
+
+# ── Graphs ───────────────────────────────────────────────────────────
+
+class GraphNode(NamedTuple):
+    id: str
+    type: str
+    inputs: tuple[str, ...]
+    params: dict  # name -> number, Expr or list, in the order written, then defaults
+    seed: str | None
+    key: str | None  # content hash when the node is pure, else None
+    where: str  # "<file>: synth '<name>' node '<id>'", for errors at render time
+
+
+class SynthGraph:
+    """One synth from ambient_profiles.json; graph(n, rng) renders n samples.
+
+    Validated when loaded, so a typo in the JSON fails at import rather than
+    halfway through a build. node_types gives the node types a graph may
+    use, and calling the graph calls render(graph, n, rng).
+    """
+
+    def __init__(self, name: str, spec: dict, where: str, node_types: dict[str, NodeType],
+                 sample_rate: int, render: Callable[..., np.ndarray]):
+        self.__name__ = name
+        self.spec = spec
+        self.description = spec.get("description", "")
+        self.node_types = node_types
+        self.sample_rate = sample_rate
+        self._render = render
+
+        self.vars: list[tuple[str, Expr]] = []
+        names: set[str] = set()
+        for var, text in spec.get("vars", {}).items():
+            if var in _CONSTANTS or var == "uniform":
+                raise ValueError(f"{where}: var {var!r} shadows a built-in")
+            self.vars.append((var, _compile_expr(str(text), names, f"{where} var {var!r}")))
+            names.add(var)
+
+        self.nodes: list[GraphNode] = []
+        keys: dict[str, str | None] = {}
+        for i, node in enumerate(spec.get("nodes") or []):
+            self.nodes.append(self._parse_node(node, i, names, keys, where))
+            keys[self.nodes[-1].id] = self.nodes[-1].key
+        if not self.nodes:
+            raise ValueError(f"{where}: has no nodes")
+
+        # Reads of each node's output, counting the synth's own output.
+        self.uses = Counter(i for node in self.nodes for i in node.inputs)
+        self.uses[self.nodes[-1].id] += 1
+
+    def _parse_node(self, node: dict, index: int, names: set[str], keys: dict[str, str | None],
+                    where: str) -> GraphNode:
+        if not isinstance(node, dict):
+            raise ValueError(f"{where} node {index}: expected an object, got {node!r}")
+        node_id = node.get("id")
+        where = f"{where} node {node_id or index!r}"
+        if not isinstance(node_id, str) or node_id in keys:
+            raise ValueError(f"{where}: needs a unique string id")
+        kind = self.node_types.get(node.get("type"))
+        if kind is None:
+            raise ValueError(f"{where}: unknown type {node.get('type')!r} "
+                             f"(choose from {', '.join(self.node_types)})")
+
+        lo, hi = kind.inputs
+        field = "input" if hi == 1 else "inputs"
+        inputs = node.get(field, [])
+        inputs = [inputs] if isinstance(inputs, str) else list(inputs)
+        if len(inputs) < lo or (hi is not None and len(inputs) > hi):
+            expected = str(lo) if hi == lo else f"at least {lo}" if hi is None else f"{lo} to {hi}"
+            raise ValueError(f"{where}: takes {expected} inputs, got {len(inputs)}")
+        for source in inputs:
+            if source not in keys:
+                raise ValueError(f"{where}: input {source!r} is not an earlier node")
+
+        written = {k: v for k, v in node.items() if k not in ("id", "type", "input", "inputs", "seed")}
+        unknown = set(written) - set(kind.required) - set(kind.defaults)
+        missing = set(kind.required) - set(written)
+        if unknown or missing:
+            raise ValueError(f"{where}: " + "; ".join(
+                [f"unknown parameter {p!r}" for p in sorted(unknown)]
+                + [f"missing parameter {p!r}" for p in sorted(missing)]))
+        params = {k: _parse_value(v, names, f"{where} {k}") for k, v in written.items()}
+        for k, v in kind.defaults.items():
+            params.setdefault(k, v)
+        _check_params(node["type"], params, len(inputs), self.sample_rate, where)
+        if node["type"] == "oscillators":
+            # [freq, gain] is a partial at phase 0.
+            params["partials"] = [p if len(p) == 3 else [p[0], 0.0, p[1]] for p in params["partials"]]
+
+        seed = None if node.get("seed") is None else str(node["seed"])
+        exprs = [e for v in params.values() for e in _exprs(v)]
+        draws = kind.random or any(e.random for e in exprs)
+        pure = ((seed is not None or not draws) and not any(e.names for e in exprs)
+                and all(keys[source] is not None for source in inputs))
+        key = None
+        if pure:
+            identity = [node["type"], written, seed, [keys[source] for source in inputs]]
+            key = hashlib.sha256(json.dumps(identity).encode("utf-8")).hexdigest()
+        return GraphNode(node_id, node["type"], tuple(inputs), params, seed, key, where)
+
+    def __call__(self, n_samples: int, rng: np.random.Generator) -> np.ndarray:
+        return self._render(self, n_samples, rng)
+
+    def __repr__(self) -> str:
+        return f"SynthGraph({self.__name__!r})"
+
+
+class NodeCache:
+    """Outputs of pure graph nodes, least recently used dropped past max_bytes.
+
+    Stored buffers are made read-only and render_graph() copies them for
+    the nodes that read them. hits and misses count lookups.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = self.misses = 0
+        self._buffers: OrderedDict[tuple, np.ndarray] = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key: tuple) -> np.ndarray | None:
+        buf = self._buffers.get(key)
+        if buf is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._buffers.move_to_end(key)
+        return buf
+
+    def clear(self) -> None:
+        """Drop every stored buffer (the hit/miss counts are kept)."""
+        self._buffers.clear()
+        self._bytes = 0
+
+    def put(self, key: tuple, buf: np.ndarray) -> bool:
+        """Keep buf (now read-only) under key; False if it is too big to."""
+        if buf.nbytes > self.max_bytes:
+            return False
+        buf.flags.writeable = False
+        self._buffers[key] = buf
+        self._bytes += buf.nbytes
+        while self._bytes > self.max_bytes:
+            _, old = self._buffers.popitem(last=False)
+            self._bytes -= old.nbytes
+        return True
+
+
+def render_graph(graph: SynthGraph, n_samples: int, rng: np.random.Generator,
+                 node_rng: Callable[[str], np.random.Generator], cache: NodeCache | None = None,
+                 cache_tag: tuple = ()) -> np.ndarray:
+    """Evaluate graph's nodes in order and return its last node's output.
+
+    Nodes with a seed of their own draw from node_rng(seed) instead of rng.
+    Pure nodes go through cache when one is given, keyed by the node, the
+    length and cache_tag (whatever else their output depends on, e.g. the
+    dtype).
+    """
+    env = dict(_CONSTANTS)
+    for name, expr in graph.vars:
+        env[name] = _evaluate(expr.tree, env, rng)
+
+    outputs: dict[str, np.ndarray] = {}
+    cached: set[str] = set()  # outputs owned by the cache
+    remaining = dict(graph.uses)
+
+    def take(node_id: str) -> np.ndarray:
+        # The last reader gets the buffer itself; earlier ones get copies.
+        remaining[node_id] -= 1
+        buf = outputs[node_id]
+        if remaining[node_id] == 0:
+            del outputs[node_id]
+            if node_id not in cached:
+                return buf
+        return buf.copy()
+
+    for node in graph.nodes:
+        cache_key = None
+        if node.key is not None and cache is not None:
+            cache_key = (node.key, n_samples, *cache_tag)
+        buf = cache.get(cache_key) if cache_key else None
+        if buf is None:
+            inputs = [take(source) for source in node.inputs]
+            rng_for_node = rng if node.seed is None else node_rng(node.seed)
+            params = {k: _resolve(v, env, rng_for_node) for k, v in node.params.items()}
+            _check_params(node.type, params, len(inputs), graph.sample_rate, node.where)
+            buf = graph.node_types[node.type].render(n_samples, rng_for_node, inputs, **params)
+            if cache_key and cache.put(cache_key, buf):
+                cached.add(node.id)
+        else:
+            cached.add(node.id)
+            for source in node.inputs:
+                take(source)
+        outputs[node.id] = buf
+    return take(graph.nodes[-1].id)
+
+
+# ── Profiles ─────────────────────────────────────────────────────────
+
+def load_profiles(path: str, node_types: dict[str, NodeType], sample_rate: int,
+                  render: Callable[..., np.ndarray]) -> tuple[dict[str, SynthGraph], dict[str, dict]]:
+    """Synth graphs and profiles from a profiles JSON file.
+
+    node_types, sample_rate and render are handed to every SynthGraph.
+    Profiles come back as {"mode": ..., "layers": {layer: [SynthGraph, ...]}},
+    one entry per variant; variants naming the same synth share its graph.
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or data.get("version") != PROFILES_VERSION:
+        raise ValueError(f"{path}: unsupported profiles file (version "
+                         f"{data.get('version') if isinstance(data, dict) else None!r})")
+
+    synths = {name: SynthGraph(name, spec, f"{path}: synth {name!r}", node_types, sample_rate, render)
+              for name, spec in data.get("synths", {}).items()}
+    profiles = {}
+    for profile_id, profile_def in data.get("profiles", {}).items():
+        where = f"{path}: profile {profile_id!r}"
+        if not isinstance(profile_def.get("mode"), str) or not profile_def.get("layers"):
+            raise ValueError(f"{where}: needs a mode and at least one layer")
+        layers = {}
+        for layer_name, names in profile_def["layers"].items():
+            unknown = [name for name in names if name not in synths]
+            if unknown or not names:
+                raise ValueError(f"{where} layer {layer_name!r}: "
+                                 + (f"unknown synth {unknown[0]!r}" if unknown else "no variants"))
+            layers[layer_name] = [synths[name] for name in names]
+        profiles[profile_id] = {"mode": profile_def["mode"], "layers": layers}
+    return synths, profiles
@@ -0,0 +1,165 @@
+"""Read-merge-write access to public/audio/ambient/manifest.json.
+
+The manifest is shared: the generator owns a few fields of the tracks it
+renders (path, duration, measured levels, sizes, encodes), while titles,
+categories and tags are edited by hand, and tracks the generator never made
+(ocean, rain, wind, zen) are listed alongside its stems. So nothing here
+rewrites the manifest from scratch. Generated entries are upserted by id
+into whatever is on disk, under a lock file, and the result is written to a
+temporary file and moved into place, so concurrent or partial renders each
+land their own tracks and readers never see a half-written file.
+
+The format is src/lib/ambientManifest.ts's AmbientManifestV3. Version 2
+manifests ({"stems": [...]}, written by older generators) are upgraded on
+load.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import stat
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+MANIFEST_VERSION = 3
+# Fields the generator owns and overwrites on every render. Any other field
+# of an existing track (title, category, tags, ...) is left as it is.
+GENERATED_FIELDS = ("path", "duration_sec", "lufs_i", "peak_dbfs", "rms_db", "centroid_hz",
+                    "loop_samples", "sample_rate", "bytes", "encodings")
+LOCK_TIMEOUT_SEC = 30.0
+LOCK_POLL_SEC = 0.05
+
+
+def empty() -> dict:
+    return {"version": MANIFEST_VERSION, "tracks": []}
+
+
+def _upgrade(data: dict, path: Path) -> dict:
+    version = data.get("version")
+    if version == MANIFEST_VERSION and isinstance(data.get("tracks"), list):
+        return data
+    if version == 2 and isinstance(data.get("stems"), list):
+        tracks = []
+        for stem in data["stems"]:
+            track = {k: v for k, v in stem.items() if k not in ("mode", "profile", "layer", "length_sec")}
+            track.setdefault("duration_sec", stem.get("length_sec"))
+            tracks.append(track)
+        return {"version": MANIFEST_VERSION, "tracks": tracks}
+    raise ValueError(f"{path}: unsupported manifest (version {version!r})")
+
+
+def load(path: str | os.PathLike) -> dict:
+    """The manifest at path, upgraded to version 3; empty if there is none."""
+    path = Path(path)
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return empty()
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: manifest is not a JSON object")
+    return _upgrade(data, path)
+
+
+def upsert(manifest: dict, tracks: list[dict],
+           generated_fields: tuple[str, ...] = GENERATED_FIELDS) -> tuple[int, int]:
+    """Merge tracks into manifest by id, in place; returns (added, updated).
+
+    A track already listed keeps its position and every field outside
+    generated_fields, gaining only those it lacks (e.g. a title, after an
+    upgrade from version 2). Generated fields are replaced, or dropped when
+    the new entry no longer has them (e.g. encodes that were switched off).
+    New tracks are appended whole, so their defaults for hand-edited fields
+    are used only until someone edits them.
+    """
+    by_id = {t["id"]: t for t in manifest["tracks"]}
+    added = updated = 0
+    for track in tracks:
+        existing = by_id.get(track["id"])
+        if existing is None:
+            manifest["tracks"].append(dict(track))
+            by_id[track["id"]] = manifest["tracks"][-1]
+            added += 1
+            continue
+        for field in generated_fields:
+            if field in track:
+                existing[field] = track[field]
+            else:
+                existing.pop(field, None)
+        for field, value in track.items():
+            existing.setdefault(field, value)
+        updated += 1
+    return added, updated
+
+
+def _format(value, indent: int = 0) -> str:
+    """JSON with two-space indents, but lists of plain values on one line.
+
+    Matches the hand-formatted manifest (tags stay ["a", "b"]), so diffs of
+    a regenerated manifest show only values that changed.
+    """
+    pad = "  " * (indent + 1)
+    if isinstance(value, dict) and value:
+        items = [f"{pad}{json.dumps(k)}: {_format(v, indent + 1)}" for k, v in value.items()]
+        return "{\n" + ",\n".join(items) + "\n" + "  " * indent + "}"
+    if isinstance(value, list) and any(isinstance(v, (dict, list)) for v in value):
+        items = [f"{pad}{_format(v, indent + 1)}" for v in value]
+        return "[\n" + ",\n".join(items) + "\n" + "  " * indent + "]"
+    return json.dumps(value, ensure_ascii=False)
+
+
+def write(manifest: dict, path: str | os.PathLike) -> None:
+    """Write manifest to path atomically (temporary file, then rename).
+
+    The file keeps its permissions (0644 when new): mkstemp() creates the
+    temporary file as 0600, which a web server running as another user
+    could not read.
+    """
+    path = Path(path)
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = 0o644
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".manifest.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="\n") as f:
+            f.write(_format(manifest) + "\n")
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+@contextmanager
+def _locked(path: Path, timeout: float = LOCK_TIMEOUT_SEC):
+    """Hold path.lock, created exclusively, for one read-merge-write."""
+    lock = path.with_name(path.name + ".lock")
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"{lock} is held; delete it if no generator is running") from None
+            time.sleep(LOCK_POLL_SEC)
+    try:
+        os.close(fd)
+        yield
+    finally:
+        os.remove(lock)
+
+
+def update(path: str | os.PathLike, tracks: list[dict]) -> tuple[int, int]:
+    """Upsert tracks into the manifest at path; returns (added, updated)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _locked(path):
+        manifest = load(path)
+        counts = upsert(manifest, tracks)
+        write(manifest, path)
+    return counts
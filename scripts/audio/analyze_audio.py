@@ -0,0 +1,585 @@
+"""Single-pass QA analysis for ambient stems.
+
+Reads each WAV once, block by block, and feeds the same samples to every
+QA gate:
+  - loudness: integrated loudness (EBU R128) via ebur128.py
+  - spectrum: mean spectral centroid and >4 kHz / <80 Hz energy ratios
+  - seam: discontinuity, level dip and spectral flux where the loop wraps
+    around, via seam.py
+
+check_loudness.py, check_spectrum.py and check_seams.py are thin wrappers
+that run one gate each; running this script runs them all from a single
+decode and prints one combined line per file. Results are cached per gate
+(see gate_cache.py), and a file is only read for the gates that actually
+need recomputing. WAVs are memory-mapped (see wavfile.py) and converted to
+float a block at a time, and every analysis is streaming, so memory stays
+flat however long a stem is. A file that can't be decoded fails once, with
+the decode error, and no gate runs on it.
+
+Usage:
+  python scripts/audio/analyze_audio.py public/audio/ambient
+
+Options:
+  --gate loudness|spectrum|seam
+                            Run only this gate (repeatable; default: all)
+  --backend native|ffmpeg   Loudness meter to use (default: native)
+  --cross-check             Meter loudness with both backends and fail
+                            when they disagree by more than 0.1 LU
+  --spectrum-backend numpy|librosa
+                            STFT implementation for the spectrum gate
+                            (default: numpy; librosa is a reference)
+  --jobs N                  Analyze N files at a time (0 = one per CPU).
+                            Lines stream as files finish; a sorted summary
+                            follows.
+  --no-cache                Re-analyze every file instead of reusing results
+                            for unchanged files from the shared gate cache
+  --report json|junit       Also write per-file metrics and timings plus a
+                            summary (totals, slowest files) as JSON or JUnit;
+                            JSON also gives the RMS level of every 1 s window
+                            (rms_envelope_db) of each file metered this run
+  --report-file PATH        Where to write it (default: audio-qa-report.json
+                            or .xml in the current directory)
+
+Requirements:
+  - numpy, scipy, soundfile (see requirements.txt)
+  - librosa, only for --spectrum-backend librosa
+  - ffmpeg on PATH, only for --backend ffmpeg and --cross-check
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import subprocess
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+from ebur128 import Loudness, LoudnessMeter
+from gate_cache import GateCache, file_digest
+from qa_report import REPORT_FORMATS, build_report, write_report
+from wavfile import iter_blocks
+
+GATES = ("loudness", "spectrum", "seam")
+
+# Loudness gate: target -30 to -34 LUFS, ±1 LUFS tolerance
+TARGET_MIN = -35.0
+TARGET_MAX = -29.0
+CROSS_CHECK_TOLERANCE = 0.1  # LU
+ENVELOPE_WINDOW_SEC = 1.0  # RMS envelope resolution in the loudness metrics
+SILENCE_DB = -120.0  # floor for levels of silent windows and stems (JSON has no -inf)
+
+# Spectrum gate
+MAX_CENTROID = 1500.0  # Hz
+MAX_HIGH_RATIO = 0.20  # energy share above 4 kHz
+MAX_LOW_RATIO = 0.15  # energy share below 80 Hz
+
+# Seam gate, each relative to the audio either side of the loop point
+MAX_SEAM_DISCONTINUITY = 4.0  # x the 99.9th percentile curvature
+MAX_SEAM_DIP_DB = 6.0  # quietest frame at the seam vs the 5th percentile frame
+MAX_SEAM_FLUX = 2.0  # x the 95th percentile spectral change
+
+# Spectrum framing, matching librosa.stft defaults (seam.py frames its flux the same)
+N_FFT = 2048
+HOP_LENGTH = 512
+SPECTRUM_BACKENDS = ("numpy", "librosa")
+
+# Bump a gate's version when it would judge an unchanged file differently.
+GATE_VERSIONS = {"loudness": 4, "spectrum": 2, "seam": 1}
+
+_DECODE_ERRORS = (OSError, RuntimeError, ValueError)  # unreadable or malformed files
+_I_RE = re.compile(r"\bI:\s*(-?\d+(?:\.\d+)?)\s*LUFS\b")
+
+
+# ── Loudness ─────────────────────────────────────────────────────────────────
+
+def ffmpeg_lufs(path: Path) -> tuple[float | None, str]:
+    """Integrated loudness from ffmpeg's ebur128 filter, or None and a reason."""
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-nostats",
+        "-i",
+        str(path),
+        "-filter_complex",
+        "ebur128=framelog=verbose",
+        "-f",
+        "null",
+        "-",
+    ]
+
+    try:
+        proc = subprocess.run(cmd, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, text=True, check=False)
+    except FileNotFoundError:
+        return None, "ffmpeg not found on PATH"
+
+    lufs = None
+    for line in proc.stderr.splitlines():
+        m = _I_RE.search(line)
+        if m:
+            try:
+                lufs = float(m.group(1))
+            except ValueError:
+                pass
+
+    if lufs is None:
+        return None, "Could not read integrated LUFS from ffmpeg output"
+    return lufs, ""
+
+
+def _lufs(backend: str, path: Path, native: Loudness | None) -> tuple[float | None, str]:
+    if backend == "native":
+        return native.integrated, ""
+    return ffmpeg_lufs(path)
+
+
+def check_loudness(path: Path, native: Loudness | None, backend: str = "native",
+                   cross_check: bool = False) -> tuple[bool, str, dict[str, float]]:
+    """Judge integrated loudness; native is the in-process meter's reading.
+
+    Returns (ok, message, metrics).
+    """
+    metrics = {}
+    if native is not None:
+        metrics = {"lufs_m_max": native.momentary_max, "lufs_s_max": native.short_term_max,
+                   "lra": native.lra}
+    lufs, err = _lufs(backend, path, native)
+    if lufs is None:
+        return False, err, metrics
+    metrics["lufs_i"] = lufs
+
+    if cross_check:
+        other = "ffmpeg" if backend == "native" else "native"
+        ref, err = _lufs(other, path, native)
+        if ref is None:
+            return False, f"cross-check: {err}", metrics
+        metrics[f"lufs_i_{other}"] = ref
+        delta = lufs - ref
+        if abs(delta) > CROSS_CHECK_TOLERANCE:
+            return (False, f"{lufs:.2f} LUFS ({backend}) vs {ref:.2f} LUFS ({other}): off by {delta:+.2f} LU",
+                    metrics)
+
+    if not (TARGET_MIN <= lufs <= TARGET_MAX):
+        return False, f"{lufs:.1f} LUFS (out of range [{TARGET_MIN:.0f}, {TARGET_MAX:.0f}])", metrics
+
+    return True, f"{lufs:.1f} LUFS", metrics
+
+
+class RmsEnvelope:
+    """Mono RMS level per window of a stream of blocks.
+
+    Only running energy sums per window are kept. The last window may be
+    shorter than the others.
+    """
+
+    def __init__(self, sr: int, window_sec: float = ENVELOPE_WINDOW_SEC):
+        self.window = max(1, int(window_sec * sr))
+        self.energy = np.zeros(0)  # sum of squares per window
+        self.samples = 0
+
+    def add(self, y: np.ndarray) -> None:
+        if len(y) == 0:
+            return
+        first = self.samples // self.window
+        at = np.arange(self.samples, self.samples + len(y)) // self.window - first
+        sums = np.bincount(at, weights=np.square(y, dtype=np.float64))
+        if first + len(sums) > len(self.energy):
+            self.energy = np.concatenate((self.energy, np.zeros(first + len(sums) - len(self.energy))))
+        self.energy[first:first + len(sums)] += sums
+        self.samples += len(y)
+
+    def lengths(self) -> np.ndarray:
+        """Samples in each window."""
+        starts = np.arange(len(self.energy)) * self.window
+        return np.minimum(self.window, self.samples - starts).clip(min=1)
+
+    def result(self) -> list[float]:
+        """RMS per window in dB, floored at SILENCE_DB."""
+        with np.errstate(divide="ignore"):
+            levels = 10 * np.log10(self.energy / self.lengths())
+        return [round(max(float(v), SILENCE_DB), 2) for v in levels]
+
+
+# ── Spectrum ─────────────────────────────────────────────────────────────────
+
+class SpectrumAccumulator:
+    """Streaming spectral metrics: mean centroid and band energy ratios.
+
+    Frames are cut exactly as librosa.stft(y) cuts them (centered, zero
+    padded, periodic Hann window), but each block of frames is reduced to
+    running sums straight away, so the full spectrogram is never held. The
+    numpy backend computes the same STFT with np.fft.rfft; librosa is kept
+    as a reference to validate it against. Feed mono blocks with add(), then
+    call result().
+    """
+
+    def __init__(self, sr: int, n_fft: int = N_FFT, hop_length: int = HOP_LENGTH,
+                 backend: str = "numpy"):
+        if backend not in SPECTRUM_BACKENDS:
+            raise ValueError(f"unknown spectrum backend: {backend}")
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.backend = backend
+        n = np.arange(n_fft)
+        self.window = (0.5 - 0.5 * np.cos(2 * np.pi * n / n_fft)).astype(np.float32)
+        self.freqs = np.fft.rfftfreq(n_fft, 1.0 / sr)
+        self._high = self.freqs > 4000
+        self._low = self.freqs < 80
+        # Center padding: frame t is centered on sample t * hop_length.
+        self._buf = np.zeros(n_fft // 2, dtype=np.float32)
+        self._samples = 0
+        self._frames = 0
+        self._centroid_sum = 0.0
+        self._total = 0.0
+        self._high_energy = 0.0
+        self._low_energy = 0.0
+
+    def add(self, y: np.ndarray) -> None:
+        self._samples += len(y)
+        self._buf = np.concatenate((self._buf, y))
+        self._consume()
+
+    def _consume(self) -> None:
+        if len(self._buf) < self.n_fft:
+            return
+        n = (len(self._buf) - self.n_fft) // self.hop_length + 1
+        S = self._magnitudes(self._buf[:(n - 1) * self.hop_length + self.n_fft])
+
+        energy = S.sum(axis=0)
+        centroids = np.divide(self.freqs @ S, energy, out=np.zeros_like(energy),
+                              where=energy > np.finfo(S.dtype).tiny)
+        self._frames += n
+        self._centroid_sum += float(centroids.sum())
+        self._total += float(energy.sum())
+        self._high_energy += float(S[self._high].sum())
+        self._low_energy += float(S[self._low].sum())
+        self._buf = self._buf[n * self.hop_length:]
+
+    def _magnitudes(self, y: np.ndarray) -> np.ndarray:
+        """|STFT| of y without padding, as (bins, frames)."""
+        if self.backend == "librosa":
+            import librosa  # optional reference; slow to import
+
+            return np.abs(librosa.stft(y, n_fft=self.n_fft, hop_length=self.hop_length, center=False))
+
+        frames = np.lib.stride_tricks.sliding_window_view(y, self.n_fft)[::self.hop_length]
+        return np.abs(np.fft.rfft(frames * self.window, axis=1)).T
+
+    def result(self) -> dict[str, float]:
+        if self._samples == 0:
+            return {"centroid": 0.0, "high_ratio": 0.0, "low_ratio": 0.0}
+
+        self.add(np.zeros(self.n_fft // 2, dtype=np.float32))
+        self._samples -= self.n_fft // 2
+        centroid = self._centroid_sum / self._frames
+        if self._total <= 0:
+            return {"centroid": centroid, "high_ratio": 0.0, "low_ratio": 0.0}
+
+        return {
+            "centroid": centroid,
+            "high_ratio": self._high_energy / self._total,
+            "low_ratio": self._low_energy / self._total,
+        }
+
+
+def check_spectrum(r: dict[str, float]) -> tuple[bool, str, dict[str, float]]:
+    """Judge spectral metrics; returns (ok, message, metrics)."""
+    problems = []
+
+    if r["centroid"] > MAX_CENTROID:
+        problems.append(f"centroid {r['centroid']:.0f}Hz")
+
+    if r["high_ratio"] > MAX_HIGH_RATIO:
+        problems.append(f">4kHz {r['high_ratio'] * 100:.1f}%")
+
+    if r["low_ratio"] > MAX_LOW_RATIO:
+        problems.append(f"<80Hz {r['low_ratio'] * 100:.1f}%")
+
+    return not problems, ", ".join(problems), r
+
+
+# ── Seam ─────────────────────────────────────────────────────────────────────
+
+def check_seam(r: dict[str, float] | None) -> tuple[bool, str, dict[str, float]]:
+    """Judge loop-seam metrics (see seam.py); returns (ok, message, metrics).
+
+    r is None for a file too short to be a loop (a UI sound, say): there is
+    no seam to judge, so the gate is skipped rather than failed.
+    """
+    if r is None:
+        return True, "seam skipped (too short to be a loop)", {}
+    problems = []
+
+    if r["discontinuity"] > MAX_SEAM_DISCONTINUITY:
+        problems.append(f"seam click {r['discontinuity']:.1f}x")
+
+    if -r["dip_db"] > MAX_SEAM_DIP_DB:
+        problems.append(f"seam dip {r['dip_db']:.1f}dB")
+
+    if r["flux"] > MAX_SEAM_FLUX:
+        problems.append(f"seam flux {r['flux']:.1f}x")
+
+    return not problems, ", ".join(problems), r
+
+
+# ── Driver ───────────────────────────────────────────────────────────────────
+
+def analyze_file(path: Path, gates: tuple[str, ...], backend: str = "native",
+                 cross_check: bool = False, spectrum_backend: str = "numpy",
+                 ) -> tuple[dict[str, tuple[bool, str, dict]], dict[str, float], list[float] | None]:
+    """Run the given gates on one file, decoding it at most once.
+
+    Returns ({gate: (ok, message, metrics)}, timings, envelope), where
+    timings splits the wall time into decode_sec (reading and converting
+    samples) and analysis_sec (everything else, including any ffmpeg run),
+    and envelope is the file's RmsEnvelope in dB, or None when loudness
+    wasn't metered natively.
+    """
+    meter = envelope = spectrum = seam = None
+    needs_samples = "spectrum" in gates or "seam" in gates or backend == "native" or cross_check
+    decode_sec = 0.0
+    start = time.perf_counter()
+    # Only opening and reading the file count as decode failures; an error in
+    # the analysis itself propagates rather than being cached as one.
+    error = None
+    if needs_samples:
+        try:
+            sr, channels, blocks = iter_blocks(path)
+        except _DECODE_ERRORS as e:
+            error = e
+    if needs_samples and error is None:
+        if "loudness" in gates and (backend == "native" or cross_check):
+            meter = LoudnessMeter(sr, channels)
+            envelope = RmsEnvelope(sr)
+        if "spectrum" in gates:
+            spectrum = SpectrumAccumulator(sr, backend=spectrum_backend)
+        if "seam" in gates:
+            # seam.py takes its framing and level floor from this module, so
+            # it is imported here rather than at the top.
+            from seam import SeamAccumulator
+            seam = SeamAccumulator(sr)
+        blocks = iter(blocks)
+        while True:
+            t = time.perf_counter()
+            try:
+                block = next(blocks, None)
+            except _DECODE_ERRORS as e:
+                error, block = e, None
+            decode_sec += time.perf_counter() - t
+            if block is None:
+                break
+            if meter:
+                meter.add(block)
+            if spectrum or seam or envelope:
+                # Downmix exactly as librosa.load(mono=True) does.
+                mono = block.mean(axis=1)
+                if envelope:
+                    envelope.add(mono)
+                if spectrum:
+                    spectrum.add(mono)
+                if seam:
+                    seam.add(mono)
+
+    if error is not None:
+        # No gate runs; each fails with the decode error, which _combine()
+        # prints once.
+        results = {gate: (False, f"Could not decode file: {error}", {}) for gate in gates}
+    else:
+        results = {}
+        if "loudness" in gates:
+            native = meter.result() if meter else None
+            results["loudness"] = check_loudness(path, native, backend, cross_check)
+        if "spectrum" in gates:
+            results["spectrum"] = check_spectrum(spectrum.result())
+        if "seam" in gates:
+            results["seam"] = check_seam(seam.result())
+
+    total = time.perf_counter() - start
+    # The full curve goes to the QA report, not the gate metrics: it is not
+    # a pass/fail number and would bloat the gate cache. The manifest only
+    # carries a summary (see generate_ambient_stems.measure_stem).
+    curve = envelope.result() if envelope and error is None else None
+    return results, {"decode_sec": decode_sec, "analysis_sec": total - decode_sec}, curve
+
+
+def _params(gate: str, backend: str, cross_check: bool, spectrum_backend: str) -> dict:
+    if gate == "loudness":
+        return {"min": TARGET_MIN, "max": TARGET_MAX, "backend": backend,
+                "cross_check": cross_check, "tolerance": CROSS_CHECK_TOLERANCE}
+    if gate == "seam":
+        return {"max_discontinuity": MAX_SEAM_DISCONTINUITY, "max_dip_db": MAX_SEAM_DIP_DB,
+                "max_flux": MAX_SEAM_FLUX}
+    return {"max_centroid": MAX_CENTROID, "max_high_ratio": MAX_HIGH_RATIO,
+            "max_low_ratio": MAX_LOW_RATIO, "backend": spectrum_backend}
+
+
+def _combine(results: dict[str, tuple], gates: tuple[str, ...]) -> tuple[bool, str]:
+    ok = all(results[gate][0] for gate in gates)
+    # dict.fromkeys: a message shared by several gates (a decode error) once
+    messages = dict.fromkeys(results[gate][1] for gate in gates if results[gate][1])
+    return ok, "; ".join(messages)
+
+
+def _format(path: Path, ok: bool, msg: str) -> str:
+    status = "OK" if ok else "FAIL"
+    return f"{status:4} {path.as_posix()}: {msg}" if msg else f"{status:4} {path.as_posix()}"
+
+
+def _pool(gates: tuple[str, ...], backend: str, cross_check: bool, jobs: int) -> Executor:
+    # ffmpeg runs out of process anyway, so threads that just wait on it are
+    # enough; the native meter and the spectrum are CPU-bound and need processes.
+    if gates == ("loudness",) and backend == "ffmpeg" and not cross_check:
+        return ThreadPoolExecutor(max_workers=jobs)
+    return ProcessPoolExecutor(max_workers=jobs)
+
+
+def _record(wav: Path, results: dict[str, tuple], timings: dict[str, float] | None,
+            envelope: list[float] | None, computed: set[str], gates: tuple[str, ...]) -> dict:
+    """One file's entry in the --report output."""
+    timings = timings or {"decode_sec": None, "analysis_sec": None}
+    return {
+        "path": wav.as_posix(),
+        "ok": _combine(results, gates)[0],
+        "decode_sec": timings["decode_sec"],
+        "analysis_sec": timings["analysis_sec"],
+        "rms_envelope_db": envelope,
+        "gates": {gate: {"ok": results[gate][0], "message": results[gate][1],
+                         "metrics": results[gate][2], "cached": gate not in computed}
+                  for gate in gates},
+    }
+
+
+def run(folder: str, gates: tuple[str, ...] = GATES, backend: str = "native",
+        cross_check: bool = False, jobs: int = 1, use_cache: bool = True,
+        spectrum_backend: str = "numpy", report: str | None = None,
+        report_file: str | None = None) -> int:
+    started = time.perf_counter()
+    root = Path(folder)
+    if not root.exists():
+        print(f"FAIL folder not found: {root}")
+        return 2
+
+    wavs = sorted(root.rglob("*.wav"))
+    if not wavs:
+        print("WARN no .wav files found (nothing to check)")
+        return 0
+
+    gates = tuple(g for g in GATES if g in gates)
+    caches = {gate: GateCache(gate, GATE_VERSIONS[gate],
+                              _params(gate, backend, cross_check, spectrum_backend),
+                              enabled=use_cache)
+              for gate in gates}
+
+    results: dict[Path, dict[str, tuple]] = {}
+    timings: dict[Path, dict[str, float]] = {}
+    envelopes: dict[Path, list[float] | None] = {}
+    keys: dict[Path, dict[str, str]] = {}
+    todo: list[tuple[Path, tuple[str, ...]]] = []
+    for wav in wavs:
+        digest = file_digest(wav) if use_cache else ""
+        keys[wav] = {gate: caches[gate].key(digest) for gate in gates}
+        results[wav] = {}
+        for gate in gates:
+            cached = caches[gate].get(wav, keys[wav][gate])
+            if cached is not None:
+                results[wav][gate] = tuple(cached)
+        missing = tuple(gate for gate in gates if gate not in results[wav])
+        if missing:
+            todo.append((wav, missing))
+
+    def finish(wav: Path, analyzed: tuple[dict[str, tuple], dict[str, float], list[float] | None]) -> None:
+        computed, timings[wav], envelopes[wav] = analyzed
+        for gate, result in computed.items():
+            results[wav][gate] = result
+            caches[gate].put(wav, keys[wav][gate], list(result))
+
+    analyze = partial(analyze_file, backend=backend, cross_check=cross_check,
+                      spectrum_backend=spectrum_backend)
+    try:
+        pending = dict(todo)
+        if jobs == 1:
+            for wav in wavs:
+                if wav in pending:
+                    finish(wav, analyze(wav, pending[wav]))
+                print(_format(wav, *_combine(results[wav], gates)))
+            failures = [wav for wav in wavs if not _combine(results[wav], gates)[0]]
+        else:
+            for wav in wavs:
+                if wav not in pending:
+                    print(_format(wav, *_combine(results[wav], gates)))
+            with _pool(gates, backend, cross_check, jobs) as pool:
+                futures = {pool.submit(analyze, wav, missing): wav for wav, missing in todo}
+                for future in as_completed(futures):
+                    wav = futures[future]
+                    finish(wav, future.result())
+                    print(_format(wav, *_combine(results[wav], gates)), flush=True)
+
+            failures = [wav for wav in wavs if not _combine(results[wav], gates)[0]]
+            print(f"\nSummary: {len(wavs)} files, {len(failures)} failed")
+            for wav in failures:
+                print(_format(wav, *_combine(results[wav], gates)))
+
+        if report:
+            records = [_record(wav, results[wav], timings.get(wav), envelopes.get(wav),
+                               set(pending.get(wav, ())), gates)
+                       for wav in wavs]
+            out = write_report(build_report(records, gates, time.perf_counter() - started), report, report_file)
+            print(f"Report: {out}")
+        return 1 if failures else 0
+    finally:
+        for cache in caches.values():
+            cache.save()
+        if use_cache:
+            hits = sum(cache.hits for cache in caches.values())
+            misses = sum(cache.misses for cache in caches.values())
+            print(f"Cache: {hits} hits, {misses} misses")
+
+
+def add_common_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("folder", help="Folder to scan recursively for .wav files")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="files to analyze concurrently (0 = one per CPU, default 1)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="re-analyze every file instead of reusing cached results")
+    parser.add_argument("--report", choices=sorted(REPORT_FORMATS),
+                        help="also write per-file metrics, timings and a summary in this format")
+    parser.add_argument("--report-file", metavar="PATH",
+                        help="report destination (default: audio-qa-report.json/.xml)")
+
+
+def add_loudness_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--backend", choices=["ffmpeg", "native"], default="native",
+                        help="Loudness meter to use (default: native)")
+    parser.add_argument("--cross-check", action="store_true",
+                        help=f"Also meter with the other backend; fail beyond {CROSS_CHECK_TOLERANCE} LU")
+
+
+def add_spectrum_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--spectrum-backend", choices=SPECTRUM_BACKENDS, default="numpy",
+                        help="STFT implementation (default: numpy; librosa is an optional reference)")
+
+
+def resolve_jobs(jobs: int) -> int:
+    return jobs if jobs > 0 else (os.cpu_count() or 1)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Loudness, spectrum and seam gates from one decode per file.")
+    add_common_args(parser)
+    add_loudness_args(parser)
+    add_spectrum_args(parser)
+    parser.add_argument("--gate", action="append", choices=GATES,
+                        help="run only this gate (repeatable; default: all)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    raise SystemExit(run(args.folder, tuple(args.gate or GATES), args.backend, args.cross_check,
+                         resolve_jobs(args.jobs), not args.no_cache, args.spectrum_backend,
+                         args.report, args.report_file))
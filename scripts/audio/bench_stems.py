@@ -0,0 +1,266 @@
+"""
+Benchmark the ambient stem synthesis pipeline.
+
+Times the generator's building blocks (noise sources, oscillator bank,
+filters, filter sweep, loop assembly), every synth graph, the full
+generate_stem() for each synth, and every profile in PROFILES rendered at
+its configured DURATIONS. Each case runs in a fresh worker process so its
+peak RSS is its own; nothing is written to public/.
+
+Usage:
+    python scripts/audio/bench_stems.py [--filter TEXT] [--repeat N]
+        [--duration SEC] [--dtype float32] [--save FILE] [--compare FILE]
+
+Options:
+    --filter TEXT  Only run cases whose name contains TEXT (repeatable).
+    --repeat N     Timed runs per case; the fastest is reported (default 3).
+    --duration SEC Length of the block, synth and stem cases (default: the
+                   longest of DURATIONS). Profile cases always use DURATIONS.
+    --dtype D      Synthesis dtype, float64 (default) or float32.
+    --save FILE    Write the results as a baseline JSON.
+    --compare FILE Compare against a saved baseline; exits 1 when a case is
+                   slower, or allocates more, than the baseline by more
+                   than --tolerance (default 0.10 = 10%).
+    --in-process   Run every case in this process: faster, but peak RSS
+                   then only ever grows and is not per case.
+    --list         List case names and exit.
+
+Columns: best wall time, throughput in output samples per second, peak RSS
+of the worker process and peak traced (NumPy + Python) allocation of one run.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+import generate_ambient_stems as gen
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BASELINE_VERSION = 1
+ALLOC_FLOOR_MIB = 1.0  # in-place cases allocate ~0; don't flag noise above that
+
+
+class Case(NamedTuple):
+    setup: Callable[[], tuple]  # untimed; returns run()'s arguments, fresh per run
+    run: Callable[..., object]
+    samples: int  # output samples produced by one run
+
+
+def _rng() -> np.random.Generator:
+    return np.random.default_rng(0)
+
+
+def _signal(n: int) -> np.ndarray:
+    return gen.pink_noise(n, _rng())
+
+
+def build_cases(duration: float) -> dict[str, Case]:
+    """Every benchmark case, by name, for blocks/synths/stems of duration seconds."""
+    n = int(duration * gen.SAMPLE_RATE)
+    fade = int(gen.CROSSFADE_SEC * gen.SAMPLE_RATE)
+    partials = [(220.0, 0.0, 1.0), (221.3, 1.0, 0.8), (441.0, 2.0, 0.3), (110.0, 0.0, 0.2)]
+
+    cases = {
+        "block:white_noise": Case(lambda: (n, _rng()), gen.white_noise, n),
+        "block:pink_noise": Case(lambda: (n, _rng()), gen.pink_noise, n),
+        "block:brown_noise": Case(lambda: (n, _rng()), gen.brown_noise, n),
+        "block:oscillator_bank": Case(lambda: (partials, n), gen.oscillator_bank, n),
+        "block:lowpass": Case(lambda: (_signal(n),), lambda x: gen.lowpass(x, 800, out=x), n),
+        "block:apply_slow_filter_sweep": Case(
+            lambda: (_signal(n), _rng()),
+            lambda x, rng: gen.apply_slow_filter_sweep(x, 800, 400, 0.05, rng, out=x), n),
+        "block:crossfade_loop": Case(lambda: (_signal(n + fade), fade), gen.crossfade_loop, n),
+        "block:normalize": Case(lambda: (_signal(n),), gen.normalize, n),
+    }
+
+    synths = sorted({fn for p in gen.PROFILES.values() for fns in p["layers"].values() for fn in fns},
+                    key=lambda fn: fn.__name__)
+    for fn in synths:
+        cases[f"synth:{fn.__name__}"] = Case(lambda: (n, _rng()), fn, n)
+    for fn in synths:
+        cases[f"stem:{fn.__name__}"] = Case(lambda fn=fn: (fn, duration, _rng()), gen.generate_stem, n)
+
+    for profile_id in gen.PROFILES:
+        targets = [gen._stem_target(task) for task in gen.build_tasks() if task[0] == profile_id]
+        samples = sum(int(t["duration"] * gen.SAMPLE_RATE) for t in targets)
+        cases[f"profile:{profile_id}"] = Case(lambda targets=targets: (targets,), _render_profile, samples)
+    return cases
+
+
+def _render_profile(targets: list[dict]) -> None:
+    for t in targets:
+        gen.generate_stem(t["synth_fn"], t["duration"], np.random.default_rng(t["seed"]))
+
+
+def _clear_caches() -> None:
+    """Forget memoized filter designs and shared graph nodes.
+
+    Both persist for the life of the process, so without this every run
+    after the first would time cache hits instead of rendering.
+    """
+    gen.design_sos.cache_clear()
+    gen.NODE_CACHE.clear()
+
+
+def _peak_rss_mib() -> float | None:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and in bytes on macOS.
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024
+
+
+def run_case(name: str, duration: float, repeat: int, dtype: str) -> dict:
+    """Time one case; runs in a worker process unless --in-process."""
+    gen.set_dtype(dtype)
+    case = build_cases(duration)[name]
+
+    best = float("inf")
+    for _ in range(repeat):
+        _clear_caches()
+        args = case.setup()
+        start = time.perf_counter()
+        case.run(*args)
+        best = min(best, time.perf_counter() - start)
+    peak_rss = _peak_rss_mib()
+
+    # One extra, traced run: tracemalloc slows things down too much to time.
+    _clear_caches()
+    args = case.setup()
+    tracemalloc.start()
+    case.run(*args)
+    alloc_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "wall_sec": best,
+        "samples_per_sec": case.samples / best if best > 0 else None,
+        "peak_rss_mib": peak_rss,
+        "alloc_peak_mib": alloc_peak / (1 << 20),
+    }
+
+
+def _run_isolated(name: str, duration: float, repeat: int, dtype: str) -> dict:
+    # A fresh process per case keeps ru_maxrss (a lifetime peak) per case.
+    # Each case gets its own one-worker pool, so that already holds where
+    # max_tasks_per_child (Python 3.11+) isn't available.
+    try:
+        pool = ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1)
+    except TypeError:
+        pool = ProcessPoolExecutor(max_workers=1)
+    with pool:
+        return pool.submit(run_case, name, duration, repeat, dtype).result()
+
+
+def _fmt(value: float | None, spec: str) -> str:
+    return "-" if value is None else format(value, spec)
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict], tolerance: float) -> list[str]:
+    """Names of cases that regressed beyond tolerance in time or allocation."""
+    regressed = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        slower = r["wall_sec"] > base["wall_sec"] * (1 + tolerance)
+        bigger = r["alloc_peak_mib"] > max(base["alloc_peak_mib"], ALLOC_FLOOR_MIB) * (1 + tolerance)
+        if slower or bigger:
+            regressed.append(name)
+    return regressed
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the ambient stem synthesis pipeline.")
+    parser.add_argument("--filter", action="append", default=[],
+                        help="only run cases whose name contains this text (repeatable)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="timed runs per case; the fastest is reported (default 3)")
+    parser.add_argument("--duration", type=float, default=max(gen.DURATIONS),
+                        help="seconds of audio per block/synth/stem case (default: longest of DURATIONS)")
+    parser.add_argument("--dtype", choices=["float64", "float32"], default="float64",
+                        help="synthesis dtype (default float64)")
+    parser.add_argument("--save", metavar="FILE", help="write the results as a baseline JSON")
+    parser.add_argument("--compare", metavar="FILE", help="compare against a saved baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="allowed slowdown/allocation growth vs the baseline (default 0.10)")
+    parser.add_argument("--in-process", action="store_true",
+                        help="run cases in this process (peak RSS is then not per case)")
+    parser.add_argument("--list", action="store_true", help="list case names and exit")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    names = [name for name in build_cases(args.duration)
+             if not args.filter or any(f in name for f in args.filter)]
+    if args.list:
+        print("\n".join(names))
+        return 0
+    if not names:
+        print("No cases match the filter.")
+        return 2
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["cases"]
+
+    run = run_case if args.in_process else _run_isolated
+    width = max(len(name) for name in names)
+    print(f"{'case':<{width}}  {'wall ms':>9}  {'Msamp/s':>8}  {'RSS MiB':>8}  {'alloc MiB':>9}"
+          + ("  vs baseline" if baseline else ""))
+    results = {}
+    for name in names:
+        r = results[name] = run(name, args.duration, args.repeat, args.dtype)
+        line = (f"{name:<{width}}  {r['wall_sec'] * 1000:9.1f}  "
+                f"{_fmt(r['samples_per_sec'] and r['samples_per_sec'] / 1e6, '8.1f')}  "
+                f"{_fmt(r['peak_rss_mib'], '8.0f')}  {r['alloc_peak_mib']:9.1f}")
+        if name in baseline:
+            base = baseline[name]
+            line += (f"  time x{r['wall_sec'] / base['wall_sec']:.2f}, "
+                     f"alloc x{r['alloc_peak_mib'] / max(base['alloc_peak_mib'], 1e-9):.2f}")
+        print(line, flush=True)
+
+    if args.save:
+        doc = {
+            "version": BASELINE_VERSION,
+            "meta": {
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "machine": platform.machine(),
+                "dtype": args.dtype,
+                "duration": args.duration,
+                "repeat": args.repeat,
+            },
+            "cases": results,
+        }
+        with open(args.save, "w") as f:
+            json.dump(doc, f, indent=2)
+            f.write("\n")
+        print(f"Baseline: {args.save}")
+
+    if baseline:
+        regressed = compare(results, baseline, args.tolerance)
+        if regressed:
+            print(f"\nRegressed beyond {args.tolerance:.0%}: {', '.join(regressed)}")
+            return 1
+        print(f"\nNo regressions beyond {args.tolerance:.0%}.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,6 +1,9 @@
 """Loudness gate for ambient stems.
 
-Checks integrated loudness (EBU R128) using ffmpeg's ebur128 filter.
+Checks integrated loudness (EBU R128). By default the WAVs are metered in
+process by ebur128.py (NumPy, BS.1770-4); ffmpeg's ebur128 filter remains
+available as a backend and as a cross-check. This runs the loudness half of
+analyze_audio.py, which can run every gate from one decode.
 
 Acceptance range:
   Target: -30 to -34 LUFS
@@ -10,85 +13,45 @@ Acceptance range:
 Usage:
   python scripts/audio/check_loudness.py public/audio/ambient
 
+Options:
+  --backend native|ffmpeg   Loudness meter to use (default: native)
+  --cross-check             Meter every file with both backends and fail
+                            when they disagree by more than 0.1 LU
+  --jobs N                  Check N files at a time (0 = one per CPU).
+                            Lines stream as files finish; a sorted summary
+                            follows.
+  --no-cache                Re-check every file instead of reusing results
+                            for unchanged files from the shared gate cache
+  --report json|junit       Also write per-file metrics and timings plus a
+                            summary (totals, slowest files)
+  --report-file PATH        Report destination (default: audio-qa-report.*)
+
 Requirements:
-  - ffmpeg on PATH
+  - numpy, scipy, soundfile (see requirements.txt)
+  - ffmpeg on PATH, only for --backend ffmpeg and --cross-check
 """
 
 from __future__ import annotations
 
-import re
-import subprocess
-import sys
-from pathlib import Path
-
-TARGET_MIN = -35.0
-TARGET_MAX = -29.0
-
-_I_RE = re.compile(r"\bI:\s*(-?\d+(?:\.\d+)?)\s*LUFS\b")
-
-
-def check_file(path: Path) -> tuple[bool, str]:
-    cmd = [
-        "ffmpeg",
-        "-hide_banner",
-        "-nostats",
-        "-i",
-        str(path),
-        "-filter_complex",
-        "ebur128=framelog=verbose",
-        "-f",
-        "null",
-        "-",
-    ]
-
-    try:
-        proc = subprocess.run(cmd, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, text=True, check=False)
-    except FileNotFoundError:
-        return False, "ffmpeg not found on PATH"
+import argparse
 
-    lufs = None
-    for line in proc.stderr.splitlines():
-        m = _I_RE.search(line)
-        if m:
-            try:
-                lufs = float(m.group(1))
-            except ValueError:
-                pass
+from analyze_audio import add_common_args, add_loudness_args, resolve_jobs, run
 
-    if lufs is None:
-        return False, "Could not read integrated LUFS from ffmpeg output"
 
-    if not (TARGET_MIN <= lufs <= TARGET_MAX):
-        return False, f"{lufs:.1f} LUFS (out of range [{TARGET_MIN:.0f}, {TARGET_MAX:.0f}])"
+def main(folder: str, backend: str = "native", cross_check: bool = False, jobs: int = 1,
+         use_cache: bool = True, report: str | None = None, report_file: str | None = None) -> int:
+    return run(folder, ("loudness",), backend, cross_check, jobs, use_cache,
+               report=report, report_file=report_file)
 
-    return True, f"{lufs:.1f} LUFS"
 
-
-def main(folder: str) -> int:
-    root = Path(folder)
-    if not root.exists():
-        print(f"FAIL folder not found: {root}")
-        return 2
-
-    wavs = sorted(root.rglob("*.wav"))
-    if not wavs:
-        print("WARN no .wav files found (nothing to check)")
-        return 0
-
-    failed = False
-    for wav in wavs:
-        ok, msg = check_file(wav)
-        status = "OK" if ok else "FAIL"
-        print(f"{status:4} {wav.as_posix()}: {msg}")
-        if not ok:
-            failed = True
-
-    return 1 if failed else 0
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Loudness gate for ambient stems.")
+    add_common_args(parser)
+    add_loudness_args(parser)
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python scripts/audio/check_loudness.py public/audio/ambient")
-        raise SystemExit(2)
-
-    raise SystemExit(main(sys.argv[1]))
+    args = parse_args()
+    raise SystemExit(main(args.folder, args.backend, args.cross_check, resolve_jobs(args.jobs),
+                          not args.no_cache, args.report, args.report_file))
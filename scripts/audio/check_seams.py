@@ -0,0 +1,56 @@
+"""Loop-seam gate for ambient stems.
+
+Measures the point where each stem wraps around from its last sample to its
+first, relative to the audio either side of it (see seam.py):
+  - Discontinuity: curvature across the seam vs the 99.9th percentile nearby
+  - Dip: quietest 50 ms within 0.5 s of the seam vs the 5th percentile frame
+  - Flux: spectral change across the seam vs the 95th percentile nearby
+
+Targets:
+  - discontinuity <= 4x
+  - dip no deeper than 6 dB
+  - flux <= 2x
+
+This runs the seam part of analyze_audio.py, which can check loudness,
+spectrum and seams from one decode. generate_ambient_stems.py --check-seams
+runs the same check on the generator's own stems.
+
+Usage:
+  python scripts/audio/check_seams.py public/audio/ambient
+
+Options:
+  --jobs N     Analyze N files at a time (0 = one per CPU)
+  --no-cache   Re-analyze every file instead of reusing results for
+               unchanged files from the shared gate cache
+  --report json|junit
+               Also write per-file metrics and timings plus a summary
+               (totals, slowest files)
+  --report-file PATH
+               Report destination (default: audio-qa-report.*)
+
+Requirements:
+  pip install -r scripts/audio/requirements.txt
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from analyze_audio import add_common_args, resolve_jobs, run
+
+
+def main(folder: str, jobs: int = 1, use_cache: bool = True, report: str | None = None,
+         report_file: str | None = None) -> int:
+    return run(folder, ("seam",), jobs=jobs, use_cache=use_cache, report=report, report_file=report_file)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Loop-seam gate for ambient stems.")
+    add_common_args(parser)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    raise SystemExit(main(args.folder, resolve_jobs(args.jobs), not args.no_cache, args.report,
+                          args.report_file))
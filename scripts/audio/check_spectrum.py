@@ -10,84 +10,52 @@ Targets:
   - >4kHz ratio <= 0.20
   - <80Hz ratio <= 0.15
 
+This runs the spectrum part of analyze_audio.py, which can run every gate
+from one decode.
+
 Usage:
   python scripts/audio/check_spectrum.py public/audio/ambient
 
+Options:
+  --backend numpy|librosa
+               STFT implementation (default: numpy). librosa gives the
+               same metrics and is kept as an optional reference.
+  --jobs N     Analyze N files at a time (0 = one per CPU)
+  --no-cache   Re-analyze every file instead of reusing results for
+               unchanged files from the shared gate cache
+  --report json|junit
+               Also write per-file metrics and timings plus a summary
+               (totals, slowest files)
+  --report-file PATH
+               Report destination (default: audio-qa-report.*)
+
 Requirements:
   pip install -r scripts/audio/requirements.txt
+  (plus librosa, only for --backend librosa)
 """
 
 from __future__ import annotations
 
-import sys
-from pathlib import Path
-
-import librosa
-import numpy as np
-
-
-def analyze(path: Path) -> dict[str, float]:
-    y, sr = librosa.load(path, sr=None, mono=True)
-    if y.size == 0:
-        return {"centroid": 0.0, "high_ratio": 0.0, "low_ratio": 0.0}
-
-    S = np.abs(librosa.stft(y))
-    freqs = librosa.fft_frequencies(sr=sr)
-
-    centroid = float(librosa.feature.spectral_centroid(S=S, freq=freqs).mean())
-
-    total_energy = float(S.sum())
-    if total_energy <= 0:
-        return {"centroid": centroid, "high_ratio": 0.0, "low_ratio": 0.0}
+import argparse
 
-    high_energy = float(S[freqs > 4000].sum())
-    low_energy = float(S[freqs < 80].sum())
+from analyze_audio import SPECTRUM_BACKENDS, add_common_args, resolve_jobs, run
 
-    return {
-        "centroid": centroid,
-        "high_ratio": high_energy / total_energy,
-        "low_ratio": low_energy / total_energy,
-    }
 
+def main(folder: str, jobs: int = 1, use_cache: bool = True, backend: str = "numpy",
+         report: str | None = None, report_file: str | None = None) -> int:
+    return run(folder, ("spectrum",), jobs=jobs, use_cache=use_cache, spectrum_backend=backend,
+               report=report, report_file=report_file)
 
-def main(folder: str) -> int:
-    root = Path(folder)
-    if not root.exists():
-        print(f"FAIL folder not found: {root}")
-        return 2
 
-    wavs = sorted(root.rglob("*.wav"))
-    if not wavs:
-        print("WARN no .wav files found (nothing to check)")
-        return 0
-
-    failed = False
-
-    for wav in wavs:
-        r = analyze(wav)
-        problems = []
-
-        if r["centroid"] > 1500:
-            problems.append(f"centroid {r['centroid']:.0f}Hz")
-
-        if r["high_ratio"] > 0.20:
-            problems.append(f">4kHz {r['high_ratio'] * 100:.1f}%")
-
-        if r["low_ratio"] > 0.15:
-            problems.append(f"<80Hz {r['low_ratio'] * 100:.1f}%")
-
-        if problems:
-            failed = True
-            print(f"FAIL {wav.as_posix()}: {', '.join(problems)}")
-        else:
-            print(f"OK   {wav.as_posix()}")
-
-    return 1 if failed else 0
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Spectral balance gate for ambient stems.")
+    add_common_args(parser)
+    parser.add_argument("--backend", choices=SPECTRUM_BACKENDS, default="numpy",
+                        help="STFT implementation (default: numpy; librosa is an optional reference)")
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python scripts/audio/check_spectrum.py public/audio/ambient")
-        raise SystemExit(2)
-
-    raise SystemExit(main(sys.argv[1]))
+    args = parse_args()
+    raise SystemExit(main(args.folder, resolve_jobs(args.jobs), not args.no_cache, args.backend,
+                          args.report, args.report_file))
@@ -0,0 +1,212 @@
+"""EBU R128 / ITU-R BS.1770-4 loudness meter in NumPy.
+
+Measures integrated loudness, momentary (400 ms) and short-term (3 s)
+maxima and loudness range (EBU Tech 3342) without shelling out to ffmpeg.
+
+The meter works on 100 ms sub-blocks: K-weighted mean squares are kept per
+sub-block, and every gated window (400 ms momentary blocks at 75% overlap,
+3 s short-term blocks) is a sum of consecutive sub-blocks. Audio can be fed
+in arbitrary chunks, so a file is metered in one streaming pass.
+
+Usage:
+  python scripts/audio/ebur128.py public/audio/ambient/some_stem.wav
+"""
+
+from __future__ import annotations
+
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from wavfile import iter_blocks
+
+SUB_BLOCK_SEC = 0.1
+MOMENTARY_SUB_BLOCKS = 4  # 400 ms
+SHORT_TERM_SUB_BLOCKS = 30  # 3 s
+ABSOLUTE_GATE = -70.0  # LUFS
+RELATIVE_GATE = -10.0  # LU, integrated loudness
+LRA_RELATIVE_GATE = -20.0  # LU, loudness range
+LRA_PERCENTILES = (0.10, 0.95)
+
+# BS.1770 channel weights for L, R, C, (LFE), Ls, Rs
+CHANNEL_WEIGHTS = (1.0, 1.0, 1.0, 0.0, 1.41, 1.41)
+
+
+def k_weighting(sample_rate: int) -> tuple[tuple[np.ndarray, np.ndarray], ...]:
+    """Both K-weighting biquads as (b, a) pairs for any sample rate.
+
+    BS.1770 only tabulates coefficients at 48 kHz; these come from the analog
+    prototypes (as in libebur128, which ffmpeg uses), so they match the
+    table exactly at 48 kHz and stay correct at 44.1 kHz.
+    """
+    # Stage 1: high shelf, +4 dB above ~1.7 kHz (head diffraction)
+    f0, gain_db, q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+    k = np.tan(np.pi * f0 / sample_rate)
+    vh = 10.0 ** (gain_db / 20.0)
+    vb = vh ** 0.4996667741545416
+    a0 = 1.0 + k / q + k * k
+    shelf = (
+        np.array([vh + vb * k / q + k * k, 2.0 * (k * k - vh), vh - vb * k / q + k * k]) / a0,
+        np.array([1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0]),
+    )
+
+    # Stage 2: RLB high-pass at ~38 Hz
+    f0, q = 38.13547087602444, 0.5003270373238773
+    k = np.tan(np.pi * f0 / sample_rate)
+    a0 = 1.0 + k / q + k * k
+    highpass = (
+        np.array([1.0, -2.0, 1.0]),
+        np.array([1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0]),
+    )
+    return shelf, highpass
+
+
+def energy_to_lufs(energy: np.ndarray | float) -> np.ndarray | float:
+    with np.errstate(divide="ignore"):
+        return -0.691 + 10.0 * np.log10(energy)
+
+
+@dataclass
+class Loudness:
+    integrated: float  # LUFS
+    momentary_max: float  # LUFS
+    short_term_max: float  # LUFS
+    lra: float  # LU
+
+
+class LoudnessMeter:
+    """Streaming BS.1770 meter: feed (frames, channels) chunks, then read."""
+
+    def __init__(self, sample_rate: int, channels: int):
+        # Deferred: scipy.signal takes most of a second to import, and the
+        # spectrum-only QA runs that import this module never meter.
+        from scipy.signal import lfilter
+
+        if channels > len(CHANNEL_WEIGHTS):
+            raise ValueError(f"unsupported channel count: {channels}")
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.weights = np.array(CHANNEL_WEIGHTS[:channels])
+        self._lfilter = lfilter
+        self.sub_block = int(round(sample_rate * SUB_BLOCK_SEC))
+        self._filters = k_weighting(sample_rate)
+        self._zi = [np.zeros((2, channels)) for _ in self._filters]
+        self._pending = np.zeros(channels)  # sum of squares of the open sub-block
+        self._pending_len = 0
+        self._energies: list[float] = []
+
+    def add(self, frames: np.ndarray) -> None:
+        frames = np.asarray(frames, dtype=np.float64)
+        if frames.ndim == 1:
+            frames = frames[:, None]
+        for i, (b, a) in enumerate(self._filters):
+            frames, self._zi[i] = self._lfilter(b, a, frames, axis=0, zi=self._zi[i])
+
+        sq = frames * frames
+        pos = 0
+        n = len(sq)
+        # Close the sub-block left open by the previous chunk.
+        if self._pending_len:
+            take = min(self.sub_block - self._pending_len, n)
+            self._pending += sq[:take].sum(axis=0)
+            self._pending_len += take
+            pos = take
+            if self._pending_len == self.sub_block:
+                self._close(self._pending)
+                self._pending = np.zeros(self.channels)
+                self._pending_len = 0
+
+        whole = (n - pos) // self.sub_block
+        if whole:
+            stop = pos + whole * self.sub_block
+            sums = sq[pos:stop].reshape(whole, self.sub_block, self.channels).sum(axis=1)
+            for row in sums:
+                self._close(row)
+            pos = stop
+
+        if pos < n:
+            self._pending += sq[pos:].sum(axis=0)
+            self._pending_len += n - pos
+
+    def _close(self, channel_sums: np.ndarray) -> None:
+        self._energies.append(float(channel_sums @ self.weights) / self.sub_block)
+
+    def _windows(self, sub_blocks: int) -> np.ndarray:
+        """Mean energy of every window of sub_blocks, at a 100 ms hop."""
+        e = np.asarray(self._energies)
+        if len(e) < sub_blocks:
+            return np.empty(0)
+        c = np.concatenate(([0.0], np.cumsum(e)))
+        return (c[sub_blocks:] - c[:-sub_blocks]) / sub_blocks
+
+    def integrated(self) -> float:
+        blocks = self._windows(MOMENTARY_SUB_BLOCKS)
+        blocks = blocks[energy_to_lufs(blocks) > ABSOLUTE_GATE]
+        if not len(blocks):
+            return float("-inf")
+        gate = energy_to_lufs(blocks.mean()) + RELATIVE_GATE
+        blocks = blocks[energy_to_lufs(blocks) > gate]
+        return float(energy_to_lufs(blocks.mean()))
+
+    def momentary_max(self) -> float:
+        blocks = self._windows(MOMENTARY_SUB_BLOCKS)
+        return float(energy_to_lufs(blocks.max())) if len(blocks) else float("-inf")
+
+    def short_term_max(self) -> float:
+        blocks = self._windows(SHORT_TERM_SUB_BLOCKS)
+        return float(energy_to_lufs(blocks.max())) if len(blocks) else float("-inf")
+
+    def loudness_range(self) -> float:
+        blocks = self._windows(SHORT_TERM_SUB_BLOCKS)
+        blocks = blocks[energy_to_lufs(blocks) > ABSOLUTE_GATE]
+        if not len(blocks):
+            return 0.0
+        gate = energy_to_lufs(blocks.mean()) + LRA_RELATIVE_GATE
+        levels = np.sort(energy_to_lufs(blocks[energy_to_lufs(blocks) > gate]))
+        if not len(levels):
+            return 0.0
+        lo, hi = (levels[int(round((len(levels) - 1) * p))] for p in LRA_PERCENTILES)
+        return float(hi - lo)
+
+    def result(self) -> Loudness:
+        return Loudness(
+            integrated=self.integrated(),
+            momentary_max=self.momentary_max(),
+            short_term_max=self.short_term_max(),
+            lra=self.loudness_range(),
+        )
+
+
+def measure(data: np.ndarray, sample_rate: int) -> Loudness:
+    data = np.asarray(data)
+    meter = LoudnessMeter(sample_rate, 1 if data.ndim == 1 else data.shape[1])
+    meter.add(data)
+    return meter.result()
+
+
+def measure_file(path: Path) -> Loudness:
+    sample_rate, channels, blocks = iter_blocks(path, dtype="float64")
+    meter = LoudnessMeter(sample_rate, channels)
+    for block in blocks:
+        meter.add(block)
+    return meter.result()
+
+
+def main(paths: list[str]) -> int:
+    for p in paths:
+        r = measure_file(Path(p))
+        print(
+            f"{p}: I {r.integrated:.1f} LUFS, M max {r.momentary_max:.1f} LUFS, "
+            f"S max {r.short_term_max:.1f} LUFS, LRA {r.lra:.1f} LU"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python scripts/audio/ebur128.py file.wav [file.wav ...]")
+        raise SystemExit(2)
+
+    raise SystemExit(main(sys.argv[1:]))
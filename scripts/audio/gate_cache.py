@@ -0,0 +1,87 @@
+"""Per-file results cache shared by the audio QA gates.
+
+Each gate stores its verdict for a WAV under a key made from the file's
+content hash, the gate's version and its thresholds/options, so a result is
+reused only while the file and the check that produced it are unchanged.
+All gates share one small JSON file next to this script (gitignored); each
+gate owns its own section and writes are merged, so gates can run one after
+another (or side by side) without clobbering each other.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+CACHE_PATH = Path(__file__).resolve().parent / ".gate_cache.json"
+HASH_CHUNK = 1 << 20
+
+
+def file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _load(path: Path) -> dict:
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+class GateCache:
+    """Results for one gate, keyed by file path and validated by content key.
+
+    With enabled=False every lookup misses and nothing is written, which is
+    what --no-cache maps to.
+    """
+
+    def __init__(self, gate: str, version: int, params: dict, enabled: bool = True,
+                 path: Path = CACHE_PATH):
+        self.gate = gate
+        self.enabled = enabled
+        self.path = path
+        self._config = json.dumps({"version": version, "params": params}, sort_keys=True)
+        self._entries: dict[str, dict] = _load(path).get(gate, {}) if enabled else {}
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, digest: str) -> str:
+        """Cache key for a file with content hash digest (see file_digest)."""
+        if not self.enabled:
+            return ""
+        return hashlib.sha256(f"{self._config}\n{digest}".encode()).hexdigest()
+
+    def get(self, file: Path, key: str) -> list | None:
+        entry = self._entries.get(file.as_posix()) if self.enabled else None
+        if entry is not None and entry.get("key") == key:
+            self.hits += 1
+            return entry["result"]
+        self.misses += 1
+        return None
+
+    def put(self, file: Path, key: str, result) -> None:
+        if self.enabled:
+            self._entries[file.as_posix()] = {"key": key, "result": result}
+            self._dirty = True
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        # Re-read so another gate's section written since we loaded survives.
+        data = _load(self.path)
+        data[self.gate] = self._entries
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=".gate_cache.", suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+        self._dirty = False
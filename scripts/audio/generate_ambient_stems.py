@@ -4,389 +4,1578 @@ Generate seamless-looping ambient audio stems for LoKey-Typer.
 Each stem is procedurally synthesized (no samples needed), crossfaded
 into itself for seamless looping, and normalized to ~-32 LUFS.
 
+Profiles, their layers and variants, and the synths behind them are data in
+scripts/audio/ambient_profiles.json, validated on load; each synth is a
+graph of source, filter, modulator and mix nodes (see ambient_graph.py).
+
+Rendered stems and their encodes are cached in scripts/audio/.stem_cache/,
+keyed by a hash of everything that determines their bytes, so unchanged
+stems are copied instead of rebuilt. Each stem's measured loudness, levels,
+centroid and exact length go into the manifest with it.
+
 Usage:
-    python scripts/audio/generate_ambient_stems.py
+    python scripts/audio/generate_ambient_stems.py [options]  (see --help)
 
 Output:
-    public/audio/ambient/{mode}/{profile}/{layer}/*.wav
+    public/audio/ambient/{mode}/{profile}/{layer}/*.wav (+ .flac, .ogg)
+    public/audio/ambient/manifest.json, merged rather than rewritten: the
+    rendered stems are upserted by id, and hand-edited titles, categories
+    and tags, as well as every other track, are kept (see ambient_manifest.py).
 """
 
+from __future__ import annotations
+
+import argparse
+import cProfile
+import hashlib
+import inspect
+import io
 import os
 import json
+import math
+import pstats
+import shutil
+import tempfile
+import time
+import tracemalloc
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache, partial, wraps
+
 import numpy as np
-from scipy.signal import butter, sosfilt
+from scipy.signal import butter, lfilter, resample_poly, sosfilt
 import soundfile as sf
 
+import ambient_graph
+import ambient_manifest
+import seam
+from ambient_graph import NodeCache, NodeType, SynthGraph, load_profiles, render_graph
+from analyze_audio import SILENCE_DB, RmsEnvelope, SpectrumAccumulator, check_seam
+from ebur128 import LoudnessMeter
+from wavfile import MappedWav, to_float
+
 SAMPLE_RATE = 44100
 BASE_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "public", "audio", "ambient")
 CROSSFADE_SEC = 2.0
 TARGET_PEAK = 0.15  # conservative peak to land around -32 LUFS
+SWEEP_BLOCK = 1024  # samples per coefficient update in modulated filters (~23 ms)
+FILTER_CACHE_SIZE = 128  # distinct SOS designs kept by design_sos()
+DTYPE = np.float64  # synthesis dtype for every buffer; see set_dtype()
+DTYPE_BLOCK = 65536  # samples per float64 block when filling float32 buffers
+OSC_ROW = 1024  # samples per row of the oscillator bank's time grid
+STREAM_BLOCK = 65536  # samples per block in --stream mode (multiple of SWEEP_BLOCK)
+STREAM_NOISE_PEAK = 4.5  # noise sources scale to ±1 at this many sigmas when streaming
+STREAM_BROWN_LEAK_HZ = 1.0  # corner of the leaky integrator behind streamed brown noise
+CACHE_DIR = os.path.join(os.path.dirname(__file__), ".stem_cache")
+CACHE_MAX_MB = 1024  # default --cache-max-mb; least recently used files go first
+ENVELOPE_POINTS = 16  # RMS envelope points per stem in the manifest
+ANALYSIS_VERSION = 1  # bump when measure_stem() would report different numbers
+PROFILES_PATH = os.path.join(os.path.dirname(__file__), "ambient_profiles.json")
+NODE_CACHE_BYTES = 256 << 20  # pure graph-node outputs kept by NODE_CACHE
 
 # ── Utility ────────────────────────────────────────────────────────
 
+def set_dtype(name: str) -> None:
+    """Select the synthesis dtype ("float64" or "float32") for this process."""
+    global DTYPE
+    DTYPE = np.dtype(name).type
+
+
+class _StreamRng:
+    """Generator stand-in used while streaming.
+
+    Synth functions draw their parameters with rng.uniform() on every call,
+    i.e. on every block. Those draws are made once and replayed on later
+    blocks; standard_normal() keeps streaming fresh noise.
+    """
+
+    def __init__(self, rng: np.random.Generator):
+        self._rng = rng
+        self._draws: list[float] = []
+        self.next_draw = 0
+
+    def uniform(self, low: float = 0.0, high: float = 1.0) -> float:
+        if self.next_draw == len(self._draws):
+            self._draws.append(self._rng.uniform(low, high))
+        value = self._draws[self.next_draw]
+        self.next_draw += 1
+        return value
+
+    def standard_normal(self, size: int) -> np.ndarray:
+        return self._rng.standard_normal(size)
+
+
+class StreamState:
+    """State carried from block to block while a stem is streamed.
+
+    Stateful helpers (filters, noise integrators, Voss rows) each take a
+    slot. Slots are handed out in call order, so a synth function gets the
+    same slot for the same helper call on every block. That holds as long as
+    the function's control flow does not depend on the block.
+    """
+
+    def __init__(self, rng: np.random.Generator):
+        self.rng = _StreamRng(rng)
+        self.offset = 0
+        self._slots: list[dict] = []
+        self._next_slot = 0
+
+    def begin_block(self, offset: int) -> None:
+        self.offset = offset
+        self._next_slot = 0
+        self.rng.next_draw = 0
+
+    def slot(self) -> dict:
+        if self._next_slot == len(self._slots):
+            self._slots.append({})
+        slot = self._slots[self._next_slot]
+        self._next_slot += 1
+        return slot
+
+
+_STREAM: StreamState | None = None  # active while write_stem_streaming() runs
+
+
+def _stream_slot() -> dict | None:
+    """The calling helper's state slot when streaming, else None."""
+    return None if _STREAM is None else _STREAM.slot()
+
+
+def _stream_offset() -> int:
+    """Absolute sample index of the current block (0 outside streaming)."""
+    return 0 if _STREAM is None else _STREAM.offset
+
+
+def _float64_blocks(n_samples: int, fill) -> np.ndarray:
+    """Build a DTYPE buffer from fill(start, stop), which returns float64.
+
+    In float64 mode this is a single call. In float32 mode fill() runs one
+    DTYPE_BLOCK at a time, so random draws and oscillator phases are
+    computed exactly as in float64 but no full-length float64 buffer exists.
+    """
+    if DTYPE == np.float64:
+        return fill(0, n_samples)
+    out = np.empty(n_samples, dtype=DTYPE)
+    for start in range(0, n_samples, DTYPE_BLOCK):
+        stop = min(start + DTYPE_BLOCK, n_samples)
+        out[start:stop] = fill(start, stop)
+    return out
+
+
+def standard_normal(n_samples: int, rng: np.random.Generator) -> np.ndarray:
+    """rng.standard_normal(n_samples) as DTYPE, same stream in either dtype."""
+    return _float64_blocks(n_samples, lambda start, stop: rng.standard_normal(stop - start))
+
+
+# ── Profiling ──────────────────────────────────────────────────────
+
+class StageProfiler:
+    """Per-stem wall time and peak allocation of each pipeline stage.
+
+    Stages nest; each is recorded under its path (e.g. "synth/pink_noise")
+    as [calls, seconds, peak bytes allocated above the level at entry].
+    Allocation comes from tracemalloc, which must be running.
+    """
+
+    def __init__(self):
+        self.stems: list[tuple[str, dict[str, list]]] = []
+        self._stages: dict[str, list] = {}
+        self._stack: list[list] = []  # [path, start time, traced at entry, peak]
+
+    def begin_stem(self, stem_id: str) -> None:
+        self._stages = {}
+        self.stems.append((stem_id, self._stages))
+
+    @contextmanager
+    def stage(self, name: str):
+        traced, traced_peak = tracemalloc.get_traced_memory()
+        if self._stack:
+            parent = self._stack[-1]
+            parent[3] = max(parent[3], traced_peak)
+            name = f"{parent[0]}/{name}"
+        # Recorded on entry so stages list in call order, parents first.
+        record = self._stages.setdefault(name, [0, 0.0, 0])
+        tracemalloc.reset_peak()
+        frame = [name, time.perf_counter(), traced, traced]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - frame[1]
+            self._stack.pop()
+            stage_peak = max(frame[3], tracemalloc.get_traced_memory()[1])
+            record[0] += 1
+            record[1] += elapsed
+            record[2] = max(record[2], stage_peak - frame[2])
+            if self._stack:
+                self._stack[-1][3] = max(self._stack[-1][3], stage_peak)
+            tracemalloc.reset_peak()
+
+    def report(self) -> str:
+        lines = []
+        for stem_id, stages in self.stems:
+            total = sum(rec[1] for path, rec in stages.items() if "/" not in path)
+            lines.append(f"\n{stem_id} ({total * 1000:.1f} ms)")
+            lines.append(f"  {'stage':<44} {'calls':>5} {'ms':>9} {'%':>6} {'peak MiB':>9}")
+            for path, (calls, seconds, peak_bytes) in stages.items():
+                label = "  " * path.count("/") + path.rsplit("/", 1)[-1]
+                share = 100 * seconds / total if total else 0.0
+                lines.append(f"  {label:<44} {calls:5d} {seconds * 1000:9.1f} {share:6.1f} "
+                             f"{peak_bytes / (1 << 20):9.1f}")
+        return "\n".join(lines)
+
+
+class _NoStage:
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+_NO_STAGE = _NoStage()
+_PROFILE: StageProfiler | None = None  # set by --profile
+
+
+def stage(name: str):
+    """Context manager recording a stage under --profile; a no-op otherwise."""
+    return _NO_STAGE if _PROFILE is None else _PROFILE.stage(name)
+
+
+def profiled(fn):
+    """Record every call of fn as a stage named after it (under --profile)."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if _PROFILE is None:
+            return fn(*args, **kwargs)
+        with _PROFILE.stage(fn.__name__):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+# ── In-place buffer ops ────────────────────────────────────────────
+#
+# Graph nodes build each stem in one output buffer and fold every new
+# source into it, so a stem peaks at a few full-length buffers rather than
+# one temporary per arithmetic step.
+
+def accumulate(out: np.ndarray, src: np.ndarray, gain: float = 1.0) -> np.ndarray:
+    """out += src * gain, in place. src is scaled in place (consumed)."""
+    if gain != 1.0:
+        src *= gain
+    out += src
+    return out
+
+
+def scale(buf: np.ndarray, gain: float, offset: float = 0.0) -> np.ndarray:
+    """buf = buf * gain + offset, in place."""
+    buf *= gain
+    if offset:
+        buf += offset
+    return buf
+
+
+def multiply(out: np.ndarray, src: np.ndarray) -> np.ndarray:
+    """out *= src, in place."""
+    out *= src
+    return out
+
+
+def peak(buf: np.ndarray) -> float:
+    """Absolute peak of buf without allocating np.abs(buf)."""
+    if buf.size == 0:
+        return 0.0
+    return max(float(buf.max()), -float(buf.min()))
+
+
+def _remove_drift(buf: np.ndarray) -> np.ndarray:
+    """Subtract the straight line from buf[0] to buf[-1], in place.
+
+    Same values as subtracting np.linspace(buf[0], buf[-1], len(buf)), built
+    one DTYPE_BLOCK at a time.
+    """
+    n = len(buf)
+    start, stop = float(buf[0]), float(buf[-1])
+    step = (stop - start) / (n - 1) if n > 1 else 0.0
+    for a in range(0, n, DTYPE_BLOCK):
+        b = min(a + DTYPE_BLOCK, n)
+        ramp = np.arange(a, b) * step + start
+        if b == n:
+            ramp[-1] = stop
+        buf[a:b] -= ramp
+    return buf
+
+
+# ── Sources and filters ────────────────────────────────────────────
+
+@profiled
 def brown_noise(n_samples: int, rng: np.random.Generator) -> np.ndarray:
-    """Generate brown noise via cumulative sum of white noise."""
-    white = rng.standard_normal(n_samples)
-    brown = np.cumsum(white)
+    """Generate brown noise via cumulative sum of white noise.
+
+    When streaming, the drift can't be removed after the fact, so a leaky
+    integrator (corner STREAM_BROWN_LEAK_HZ) is used instead and scaled
+    by its theoretical sigma.
+    """
+    slot = _stream_slot()
+    if slot is not None:
+        leak = np.exp(-2 * np.pi * STREAM_BROWN_LEAK_HZ / SAMPLE_RATE)
+        white = standard_normal(n_samples, rng)
+        brown, slot["zi"] = lfilter([1.0], [1.0, -leak], white, zi=slot.get("zi", np.zeros(1)))
+        sigma = 1.0 / np.sqrt(1.0 - leak * leak)
+        brown /= STREAM_NOISE_PEAK * sigma
+        return brown.astype(DTYPE, copy=False)
+
+    carry = 0.0
+
+    def fill(start: int, stop: int) -> np.ndarray:
+        # Integrate in float64 even when storing float32, carrying the
+        # running sum from block to block.
+        nonlocal carry
+        block = np.cumsum(rng.standard_normal(stop - start)) + carry
+        carry = block[-1]
+        return block
+
+    brown = _float64_blocks(n_samples, fill)
     # Remove DC drift
-    brown -= np.linspace(brown[0], brown[-1], n_samples)
-    return brown / (np.abs(brown).max() + 1e-12)
+    _remove_drift(brown)
+    return np.divide(brown, peak(brown) + 1e-12, out=brown)
 
 
+@profiled
 def pink_noise(n_samples: int, rng: np.random.Generator) -> np.ndarray:
-    """Approximate pink noise using Voss-McCartney algorithm."""
+    """Approximate pink noise using Voss-McCartney algorithm.
+
+    Row i holds each value for 2**i samples, so only ceil(n / 2**i) draws
+    are made for it, and they are added in place through a (blocks, step)
+    view of the output. Peak memory is about two full-length buffers.
+    """
     n_rows = 16
-    out = np.zeros(n_samples)
-    rows = rng.standard_normal((n_rows, n_samples))
+    out = np.zeros(n_samples, dtype=DTYPE)
+    slot = _stream_slot()
+    if slot is not None:
+        return _pink_noise_block(out, n_rows, rng, slot)
+
     # Each row updates at progressively slower rates
     for i in range(n_rows):
         step = 2 ** i
-        held = np.repeat(rows[i, ::step], step)[:n_samples]
-        out += held
+        values = standard_normal(-(-n_samples // step), rng)
+        full = n_samples // step
+        held = out[:full * step].reshape(full, step)
+        held += values[:full, None]
+        if full < len(values):
+            out[full * step:] += values[full]
     out /= n_rows
-    return out / (np.abs(out).max() + 1e-12)
+    return np.divide(out, peak(out) + 1e-12, out=out)
+
+
+def _pink_noise_block(out: np.ndarray, n_rows: int, rng, slot: dict) -> np.ndarray:
+    """Streaming Voss-McCartney: rows update on absolute sample indices.
 
+    Each row's current value is kept in the slot, so a row that changes
+    every 2**i samples stays aligned across block boundaries.
+    """
+    start = _stream_offset()
+    stop = start + len(out)
+    held = slot.setdefault("held", np.zeros(n_rows))
+    for i in range(n_rows):
+        step = 2 ** i
+        first = -(-start // step) * step  # first update at or after start
+        n_new = len(range(first, stop, step))
+        values = np.empty(n_new + 1)
+        values[0] = held[i]
+        values[1:] = rng.standard_normal(n_new)
+        out += values[(np.arange(start, stop) - first) // step + 1]
+        held[i] = values[-1]
+    out /= n_rows
+    # The row mean of n_rows unit normals has sigma 1 / sqrt(n_rows).
+    out /= STREAM_NOISE_PEAK / np.sqrt(n_rows)
+    return out
 
+
+@profiled
 def white_noise(n_samples: int, rng: np.random.Generator) -> np.ndarray:
-    w = rng.standard_normal(n_samples)
-    return w / (np.abs(w).max() + 1e-12)
+    w = standard_normal(n_samples, rng)
+    if _STREAM is not None:
+        w /= STREAM_NOISE_PEAK
+        return w
+    return np.divide(w, peak(w) + 1e-12, out=w)
+
+
+@profiled
+def oscillator_bank(partials: list[tuple[float, float, float]], n_samples: int,
+                    out: np.ndarray | None = None) -> np.ndarray:
+    """Sum of gain * sin(2*pi*freq*t + phase) over (freq, phase, gain) partials.
+
+    Time is laid out as rows of OSC_ROW samples, t = row * OSC_ROW + col, so
+    each partial's phasor factors into a per-row and a per-column rotation.
+    The whole bank is then Im(rows @ cols): two small real matrix products
+    per DTYPE_BLOCK and no sin() per sample. Angles are evaluated directly
+    in float64, never accumulated, so nothing drifts over long stems. Adds
+    into out when given.
+    """
+    freqs, phases, gains = (np.asarray(c, dtype=np.float64) for c in zip(*partials))
+    omega = 2 * np.pi * freqs / SAMPLE_RATE
+    col_angle = np.outer(omega, np.arange(OSC_ROW))
+    col_re, col_im = np.cos(col_angle), np.sin(col_angle)
+
+    if out is None:
+        out = np.zeros(n_samples, dtype=DTYPE)
+    offset = _stream_offset()
+    rows_per_block = max(1, DTYPE_BLOCK // OSC_ROW)
+    n_rows = -(-n_samples // OSC_ROW)
+    for r0 in range(0, n_rows, rows_per_block):
+        r1 = min(r0 + rows_per_block, n_rows)
+        row_angle = np.outer(offset + np.arange(r0, r1) * OSC_ROW, omega) + phases
+        row_re = np.cos(row_angle) * gains
+        row_im = np.sin(row_angle) * gains
+        # Im((a + ib)(c + id)) = a*d + b*c
+        block = row_re @ col_im + row_im @ col_re
+        start, stop = r0 * OSC_ROW, min(r1 * OSC_ROW, n_samples)
+        out[start:stop] += block.ravel()[:stop - start]
+    return out
 
 
 def sine_wave(freq: float, n_samples: int, phase: float = 0.0) -> np.ndarray:
-    t = np.arange(n_samples) / SAMPLE_RATE
-    return np.sin(2 * np.pi * freq * t + phase)
+    return oscillator_bank([(freq, phase, 1.0)], n_samples)
 
 
 def lfo(rate_hz: float, n_samples: int, phase: float = 0.0) -> np.ndarray:
     """Slow sine LFO, range [0, 1]."""
-    return 0.5 + 0.5 * sine_wave(rate_hz, n_samples, phase)
+    return scale(sine_wave(rate_hz, n_samples, phase), 0.5, 0.5)
+
+
+@lru_cache(maxsize=FILTER_CACHE_SIZE)
+def design_sos(btype: str, cutoff: float | tuple[float, float], order: int,
+               fs: int = SAMPLE_RATE) -> np.ndarray:
+    """Memoized Butterworth SOS design shared by every fixed filter.
+
+    Filter design is pure, and the same handful of cutoffs is requested many
+    times per library build. The returned array is shared between callers
+    and must not be modified. Hit/miss counts: design_sos.cache_info().
+    """
+    wn = list(cutoff) if isinstance(cutoff, tuple) else cutoff
+    return butter(order, wn, btype=btype, fs=fs, output="sos")
+
+
+def _sosfilt(sos: np.ndarray, data: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+    """sosfilt() into out (may be data itself), keeping data's dtype.
+
+    Runs one DTYPE_BLOCK at a time with the state carried over, so only a
+    block-sized temporary exists and out=data filters in place. Coefficients
+    and state stay float64 even for float32 data: rounding the coefficients
+    of a low-cutoff 4th-order section to float32 costs about 1 LSB at PCM_16.
+    """
+    if out is None:
+        out = np.empty_like(data)
+    slot = _stream_slot()
+    zi = slot.get("zi") if slot else None
+    if zi is None:
+        zi = np.zeros((sos.shape[0], 2))
+    for start in range(0, len(data), DTYPE_BLOCK):
+        stop = min(start + DTYPE_BLOCK, len(data))
+        out[start:stop], zi = sosfilt(sos, data[start:stop], zi=zi)
+    if slot is not None:
+        slot["zi"] = zi
+    return out
+
+
+@profiled
+def lowpass(data: np.ndarray, cutoff: float, order: int = 4,
+            out: np.ndarray | None = None) -> np.ndarray:
+    return _sosfilt(design_sos("low", float(cutoff), order), data, out)
+
+
+@profiled
+def highpass(data: np.ndarray, cutoff: float, order: int = 4,
+             out: np.ndarray | None = None) -> np.ndarray:
+    return _sosfilt(design_sos("high", float(cutoff), order), data, out)
+
 
+@profiled
+def bandpass(data: np.ndarray, low: float, high: float, order: int = 4,
+             out: np.ndarray | None = None) -> np.ndarray:
+    return _sosfilt(design_sos("band", (float(low), float(high)), order), data, out)
 
-def lowpass(data: np.ndarray, cutoff: float, order: int = 4) -> np.ndarray:
-    sos = butter(order, cutoff, btype="low", fs=SAMPLE_RATE, output="sos")
-    return sosfilt(sos, data)
 
+def biquad_coefficients(cutoffs: np.ndarray, btype: str = "low") -> tuple[np.ndarray, np.ndarray]:
+    """Second-order Butterworth (b, a) coefficients for an array of cutoffs.
 
-def highpass(data: np.ndarray, cutoff: float, order: int = 4) -> np.ndarray:
-    sos = butter(order, cutoff, btype="high", fs=SAMPLE_RATE, output="sos")
-    return sosfilt(sos, data)
+    Closed-form bilinear transform with pre-warping, so designing one filter
+    per block is a handful of vectorized NumPy ops rather than a butter()
+    call each. Matches butter(2, cutoff, btype, fs=SAMPLE_RATE).
+    Returns arrays of shape (len(cutoffs), 3).
+    """
+    k = np.tan(np.pi * np.asarray(cutoffs, dtype=np.float64) / SAMPLE_RATE)
+    k2 = k * k
+    norm = 1.0 / (1.0 + np.sqrt(2.0) * k + k2)
+    if btype == "low":
+        b0 = k2 * norm
+        b = np.stack([b0, 2.0 * b0, b0], axis=-1)
+    elif btype == "high":
+        b = np.stack([norm, -2.0 * norm, norm], axis=-1)
+    else:
+        raise ValueError(f"unsupported btype: {btype!r}")
+    a = np.stack([np.ones_like(k), 2.0 * (k2 - 1.0) * norm, (1.0 - np.sqrt(2.0) * k + k2) * norm], axis=-1)
+    return b, a
 
 
-def bandpass(data: np.ndarray, low: float, high: float, order: int = 4) -> np.ndarray:
-    sos = butter(order, [low, high], btype="band", fs=SAMPLE_RATE, output="sos")
-    return sosfilt(sos, data)
+def modulated_filter(data: np.ndarray, cutoffs: np.ndarray, btype: str = "low",
+                     block_size: int = SWEEP_BLOCK, out: np.ndarray | None = None) -> np.ndarray:
+    """Filter with a time-varying cutoff, one coefficient set per block.
 
+    cutoffs holds one value (Hz) per block of block_size samples. Filter
+    state is carried from block to block, so moving the cutoff never resets
+    the filter and there is no discontinuity at block boundaries. out may
+    be data itself.
+    """
+    n = len(data)
+    n_blocks = -(-n // block_size)
+    if len(cutoffs) != n_blocks:
+        raise ValueError(f"expected {n_blocks} cutoffs for {n} samples, got {len(cutoffs)}")
+
+    b, a = biquad_coefficients(cutoffs, btype)
+    # Coefficients and state stay float64 (see _sosfilt); only the output
+    # takes data's dtype.
+    if out is None:
+        out = np.empty_like(data)
+    slot = _stream_slot()
+    zi = slot.get("zi") if slot else None
+    if zi is None:
+        zi = np.zeros(2)
+    for i, start in enumerate(range(0, n, block_size)):
+        end = min(start + block_size, n)
+        out[start:end], zi = lfilter(b[i], a[i], data[start:end], zi=zi)
+    if slot is not None:
+        slot["zi"] = zi
+    return out
+
+
+def block_centers(n_samples: int, block_size: int = SWEEP_BLOCK) -> np.ndarray:
+    """Time in seconds at the middle of each block, for sampling modulators."""
+    starts = np.arange(0, n_samples, block_size)
+    ends = np.minimum(starts + block_size, n_samples)
+    return (starts + ends) / 2 / SAMPLE_RATE
 
+
+@profiled
 def apply_slow_filter_sweep(data: np.ndarray, base_cutoff: float,
                             sweep_range: float, lfo_rate: float,
-                            rng: np.random.Generator) -> np.ndarray:
-    """Apply a slowly varying lowpass filter by processing in chunks."""
-    chunk_size = SAMPLE_RATE // 4  # 250ms chunks
-    n = len(data)
-    mod = lfo(lfo_rate, n, phase=rng.uniform(0, 2 * np.pi))
-    out = np.zeros(n)
+                            rng: np.random.Generator,
+                            out: np.ndarray | None = None) -> np.ndarray:
+    """Apply a slowly varying lowpass filter driven by a sine LFO."""
+    phase = rng.uniform(0, 2 * np.pi)
+    t = block_centers(len(data)) + _stream_offset() / SAMPLE_RATE
+    mod = 0.5 + 0.5 * np.sin(2 * np.pi * lfo_rate * t + phase)
+    cutoffs = np.clip(base_cutoff + sweep_range * mod, 40, SAMPLE_RATE * 0.45)
+    return modulated_filter(data, cutoffs, btype="low", out=out)
 
-    for start in range(0, n, chunk_size):
-        end = min(start + chunk_size, n)
-        mid = (start + end) // 2
-        cutoff = base_cutoff + sweep_range * mod[mid]
-        cutoff = np.clip(cutoff, 40, SAMPLE_RATE * 0.45)
-        chunk = data[start:end]
-        out[start:end] = lowpass(chunk, cutoff, order=2)
 
-    return out
+# ── Loop assembly ──────────────────────────────────────────────────
 
 
 def crossfade_loop(audio: np.ndarray, fade_samples: int) -> np.ndarray:
-    """Make audio seamlessly loopable via raised-cosine crossfade."""
+    """Make audio seamlessly loopable via raised-cosine crossfade.
+
+    Works in place: the tail is blended into the head and a view without
+    the tail is returned.
+    """
     n = len(audio)
     if n <= fade_samples * 2:
         return audio
 
     # The tail overlaps with the head
+    blend_tail_into_head(audio[:fade_samples], audio[n - fade_samples:])
+    # Trim the tail (it's now baked into the head)
+    return audio[:n - fade_samples]
+
+
+def blend_tail_into_head(head: np.ndarray, tail: np.ndarray) -> np.ndarray:
+    """Raised-cosine blend head = head * fade_in + tail * fade_out, in place.
+
+    tail is overwritten with its faded copy.
+    """
+    fade_samples = len(head)
     fade_in = 0.5 * (1 - np.cos(np.pi * np.arange(fade_samples) / fade_samples))
+    fade_in = fade_in.astype(head.dtype, copy=False)
     fade_out = 1.0 - fade_in
 
-    result = audio.copy()
-    # Blend tail into head
-    result[:fade_samples] = audio[:fade_samples] * fade_in + audio[n - fade_samples:] * fade_out
-    # Trim the tail (it's now baked into the head)
-    result = result[:n - fade_samples]
-    return result
+    head *= fade_in
+    head += multiply(tail, fade_out)
+    return head
 
 
 def normalize(audio: np.ndarray, target_peak: float = TARGET_PEAK) -> np.ndarray:
-    peak = np.abs(audio).max()
-    if peak < 1e-12:
+    """Scale audio in place so its absolute peak is target_peak."""
+    audio_peak = peak(audio)
+    if audio_peak < 1e-12:
         return audio
-    return audio * (target_peak / peak)
-
-
-def gentle_fade_in(audio: np.ndarray, seconds: float = 0.5) -> np.ndarray:
-    """Apply a gentle fade-in to avoid click at start."""
-    n = int(seconds * SAMPLE_RATE)
-    n = min(n, len(audio))
-    fade = 0.5 * (1 - np.cos(np.pi * np.arange(n) / n))
-    audio = audio.copy()
-    audio[:n] *= fade
-    return audio
+    return np.multiply(audio, target_peak / audio_peak, out=audio)
 
 
 def generate_stem(synth_fn, duration_sec: float, rng: np.random.Generator) -> np.ndarray:
-    """Generate a loopable stem: synthesize with overlap, crossfade, normalize."""
+    """Generate a loopable stem: synthesize with overlap, crossfade, normalize.
+
+    Every post-synthesis step works in place on the synth's output buffer.
+    There is deliberately no fade-in: the app loops stems from a random
+    offset and ramps their gain itself, so one would only dip the level
+    every time the loop comes round.
+    """
     fade_samples = int(CROSSFADE_SEC * SAMPLE_RATE)
     total_samples = int(duration_sec * SAMPLE_RATE) + fade_samples
 
-    raw = synth_fn(total_samples, rng)
-    looped = crossfade_loop(raw, fade_samples)
-    looped = gentle_fade_in(looped)
-    return normalize(looped)
-
-
-# ── Synth functions per layer ──────────────────────────────────────
-
-def synth_low_bed_warm(n: int, rng: np.random.Generator) -> np.ndarray:
-    """Warm sub-bass bed: filtered brown noise with slow LFO on cutoff."""
-    noise = brown_noise(n, rng)
-    swept = apply_slow_filter_sweep(noise, base_cutoff=120, sweep_range=60,
-                                     lfo_rate=0.03 + rng.uniform(0, 0.02), rng=rng)
-    # Add a very quiet sub-sine for body
-    sub = sine_wave(55 + rng.uniform(-5, 5), n) * 0.15
-    return lowpass(swept + sub, 200)
-
-
-def synth_low_bed_deep(n: int, rng: np.random.Generator) -> np.ndarray:
-    """Deeper variant with lower cutoff and slower movement."""
-    noise = brown_noise(n, rng)
-    swept = apply_slow_filter_sweep(noise, base_cutoff=90, sweep_range=40,
-                                     lfo_rate=0.02 + rng.uniform(0, 0.01), rng=rng)
-    sub = sine_wave(45 + rng.uniform(-3, 3), n) * 0.2
-    return lowpass(swept + sub, 160)
-
-
-def synth_low_bed_bright(n: int, rng: np.random.Generator) -> np.ndarray:
-    """Slightly brighter bed for competitive mode."""
-    noise = brown_noise(n, rng)
-    swept = apply_slow_filter_sweep(noise, base_cutoff=180, sweep_range=80,
-                                     lfo_rate=0.04 + rng.uniform(0, 0.02), rng=rng)
-    return lowpass(swept, 280)
-
-
-def synth_mid_texture_pad(n: int, rng: np.random.Generator) -> np.ndarray:
-    """Warm pad: layered detuned sines with slow amplitude modulation."""
-    base_freq = 220 + rng.uniform(-10, 10)
-    detune = rng.uniform(0.5, 2.0)
-
-    s1 = sine_wave(base_freq, n)
-    s2 = sine_wave(base_freq + detune, n, phase=rng.uniform(0, 2 * np.pi))
-    s3 = sine_wave(base_freq * 2 + rng.uniform(-2, 2), n, phase=rng.uniform(0, 2 * np.pi))
-    s4 = sine_wave(base_freq * 0.5, n) * 0.5
-
-    chord = s1 + s2 * 0.8 + s3 * 0.3 + s4 * 0.4
-    # Slow amplitude modulation
-    mod = lfo(0.05 + rng.uniform(0, 0.03), n, phase=rng.uniform(0, 2 * np.pi))
-    mod = 0.6 + 0.4 * mod  # range [0.6, 1.0]
-    return lowpass(chord * mod, 2000)
-
-
-def synth_mid_texture_shimmer(n: int, rng: np.random.Generator) -> np.ndarray:
-    """Shimmery harmonic texture with gentle beating."""
-    base = 330 + rng.uniform(-15, 15)
-    s1 = sine_wave(base, n)
-    s2 = sine_wave(base * 1.002, n)  # very slight detuning for shimmer
-    s3 = sine_wave(base * 0.749, n, phase=rng.uniform(0, np.pi)) * 0.5  # fifth below
-    s4 = sine_wave(base * 1.498, n) * 0.25  # fifth above, quiet
-
-    mix = s1 + s2 + s3 + s4
-    mod = lfo(0.04 + rng.uniform(0, 0.02), n) * 0.3 + 0.7
-    return lowpass(mix * mod, 3000)
-
-
-def synth_mid_texture_organic(n: int, rng: np.random.Generator) -> np.ndarray:
-    """Organic texture: filtered noise + sine blend for nature profile."""
-    noise = pink_noise(n, rng)
-    filtered = bandpass(noise, 200, 1500)
-    tone = sine_wave(165 + rng.uniform(-8, 8), n) * 0.3
-    mod = lfo(0.06 + rng.uniform(0, 0.03), n) * 0.4 + 0.6
-    return (filtered * 0.7 + tone) * mod
-
-
-def synth_mid_presence_clean(n: int, rng: np.random.Generator) -> np.ndarray:
-    """Mid presence for competitive: brighter filtered noise with resonance."""
-    noise = pink_noise(n, rng)
-    filtered = bandpass(noise, 400, 3000)
-    swept = apply_slow_filter_sweep(filtered, base_cutoff=2000, sweep_range=800,
-                                     lfo_rate=0.05 + rng.uniform(0, 0.02), rng=rng)
-    return swept
-
-
-def synth_mid_presence_focused(n: int, rng: np.random.Generator) -> np.ndarray:
-    """Tighter mid presence with slight tonal character."""
-    noise = pink_noise(n, rng)
-    filtered = bandpass(noise, 500, 2500)
-    tone = sine_wave(440 + rng.uniform(-20, 20), n) * 0.15
-    mod = lfo(0.03, n) * 0.3 + 0.7
-    return (filtered + tone) * mod
-
-
-def synth_mid_presence_airy(n: int, rng: np.random.Generator) -> np.ndarray:
-    """Airy mid presence — lighter, more breath-like."""
-    noise = white_noise(n, rng)
-    filtered = bandpass(noise, 800, 4000)
-    mod = lfo(0.07 + rng.uniform(0, 0.03), n) * 0.35 + 0.65
-    return filtered * mod * 0.6
-
-
-def synth_air_gentle(n: int, rng: np.random.Generator) -> np.ndarray:
-    """Gentle airy breath: high-passed pink noise with slow filter drift."""
-    noise = pink_noise(n, rng)
-    hp = highpass(noise, 2000)
-    swept = apply_slow_filter_sweep(hp, base_cutoff=5000, sweep_range=2000,
-                                     lfo_rate=0.02 + rng.uniform(0, 0.015), rng=rng)
-    mod = lfo(0.03 + rng.uniform(0, 0.02), n) * 0.25 + 0.75
-    return swept * mod
-
-
-def synth_air_soft(n: int, rng: np.random.Generator) -> np.ndarray:
-    """Softer air with less high frequency content."""
-    noise = pink_noise(n, rng)
-    hp = highpass(noise, 1500)
-    lp = lowpass(hp, 6000)
-    mod = lfo(0.025 + rng.uniform(0, 0.015), n) * 0.2 + 0.8
-    return lp * mod
-
-
-def synth_air_breeze(n: int, rng: np.random.Generator) -> np.ndarray:
-    """Breeze-like air for nature profile — wider, more organic movement."""
-    noise = pink_noise(n, rng)
-    hp = highpass(noise, 1000)
-    # More pronounced LFO for breeze-like swells
-    mod = lfo(0.08 + rng.uniform(0, 0.04), n) * 0.45 + 0.55
-    swept = apply_slow_filter_sweep(hp, base_cutoff=4000, sweep_range=2500,
-                                     lfo_rate=0.06, rng=rng)
-    return swept * mod
-
-
-def synth_room_wash(n: int, rng: np.random.Generator) -> np.ndarray:
-    """Ultra-quiet reverb-like room wash."""
-    noise = white_noise(n, rng)
-    filtered = lowpass(noise, 1200)
-    filtered = highpass(filtered, 80)
-    # Very slow, very subtle
-    mod = lfo(0.015 + rng.uniform(0, 0.01), n) * 0.15 + 0.85
-    return filtered * mod * 0.4
-
-
-def synth_room_deep(n: int, rng: np.random.Generator) -> np.ndarray:
-    """Deeper room tone — more low-end."""
-    noise = white_noise(n, rng)
-    filtered = lowpass(noise, 800)
-    filtered = highpass(filtered, 40)
-    mod = lfo(0.01 + rng.uniform(0, 0.01), n) * 0.1 + 0.9
-    return filtered * mod * 0.35
-
-
-def synth_room_air(n: int, rng: np.random.Generator) -> np.ndarray:
-    """Room with slightly more air — nature variant."""
-    noise = white_noise(n, rng)
-    filtered = lowpass(noise, 2000)
-    filtered = highpass(filtered, 100)
-    mod = lfo(0.02 + rng.uniform(0, 0.015), n) * 0.2 + 0.8
-    return filtered * mod * 0.35
+    with stage("synth"):
+        raw = synth_fn(total_samples, rng)
+    with stage("crossfade"):
+        looped = crossfade_loop(raw, fade_samples)
+    with stage("normalize"):
+        return normalize(looped)
 
 
-# ── Profile definitions ────────────────────────────────────────────
+def write_stem_streaming(synth_fn, duration_sec: float, rng: np.random.Generator,
+                         path: str, block_size: int = STREAM_BLOCK) -> int:
+    """Synthesize block by block and write a loopable PCM_16 WAV to path.
 
-PROFILES = {
-    "focus_soft": {
-        "mode": "focus",
-        "layers": {
-            "low_bed": [synth_low_bed_warm, synth_low_bed_warm, synth_low_bed_deep],
-            "mid_texture": [synth_mid_texture_pad, synth_mid_texture_pad, synth_mid_texture_shimmer],
-            "air": [synth_air_gentle, synth_air_soft, synth_air_gentle],
-        },
-    },
-    "focus_warm": {
-        "mode": "focus",
-        "layers": {
-            "low_bed": [synth_low_bed_deep, synth_low_bed_deep, synth_low_bed_warm],
-            "mid_texture": [synth_mid_texture_shimmer, synth_mid_texture_pad, synth_mid_texture_shimmer],
-            "air": [synth_air_soft, synth_air_gentle, synth_air_soft],
-            "room": [synth_room_wash, synth_room_deep, synth_room_wash],
-        },
-    },
-    "competitive_clean": {
-        "mode": "competitive",
-        "layers": {
-            "low_bed": [synth_low_bed_bright, synth_low_bed_bright, synth_low_bed_warm],
-            "mid_presence": [synth_mid_presence_clean, synth_mid_presence_focused, synth_mid_presence_airy],
-            "air": [synth_air_gentle, synth_air_gentle, synth_air_soft],
-        },
-    },
-    "nature_air": {
-        "mode": "focus",
-        "layers": {
-            "low_bed": [synth_low_bed_warm, synth_low_bed_deep, synth_low_bed_warm],
-            "mid_texture": [synth_mid_texture_organic, synth_mid_texture_organic, synth_mid_texture_pad],
-            "air": [synth_air_breeze, synth_air_breeze, synth_air_gentle],
-            "room": [synth_room_air, synth_room_wash, synth_room_air],
-        },
-    },
+    Only the loop's head and tail windows (CROSSFADE_SEC each) and one block
+    are held in memory. The middle goes to a temporary float WAV because its
+    normalization gain is only known once every block has been seen. The
+    second pass scales it into path. Returns the stem length in samples.
+    """
+    global _STREAM
+
+    fade_samples = int(CROSSFADE_SEC * SAMPLE_RATE)
+    loop_samples = int(duration_sec * SAMPLE_RATE)
+    total_samples = loop_samples + fade_samples
+    if loop_samples <= fade_samples:
+        raise ValueError(f"duration {duration_sec}s is too short to stream")
+
+    head = np.empty(fade_samples, dtype=DTYPE)
+    tail = np.empty(fade_samples, dtype=DTYPE)
+    middle_peak = 0.0
+    subtype = "DOUBLE" if DTYPE == np.float64 else "FLOAT"
+    fd, tmp_path = tempfile.mkstemp(suffix=".wav", dir=os.path.dirname(path) or None)
+    os.close(fd)
+
+    try:
+        state = StreamState(rng)
+        _STREAM = state
+        with sf.SoundFile(tmp_path, "w", SAMPLE_RATE, 1, subtype=subtype) as middle:
+            for start in range(0, total_samples, block_size):
+                stop = min(start + block_size, total_samples)
+                state.begin_block(start)
+                with stage("synth"):
+                    block = synth_fn(stop - start, state.rng)
+
+                # Route the block's samples to head, middle or tail.
+                for lo, hi, dest in ((0, fade_samples, head),
+                                     (fade_samples, loop_samples, None),
+                                     (loop_samples, total_samples, tail)):
+                    a, b = max(start, lo), min(stop, hi)
+                    if a >= b:
+                        continue
+                    part = block[a - start:b - start]
+                    if dest is None:
+                        middle.write(part)
+                        middle_peak = max(middle_peak, peak(part))
+                    else:
+                        dest[a - lo:b - lo] = part
+        _STREAM = None
+
+        # Same head as crossfade_loop(): the tail is blended into it.
+        with stage("crossfade"):
+            looped_head = blend_tail_into_head(head, tail)
+        stem_peak = max(peak(looped_head), middle_peak)
+        gain = TARGET_PEAK / stem_peak if stem_peak >= 1e-12 else 1.0
+
+        # Normalization happens on the way out, in the second pass.
+        with stage("normalize_write"), sf.SoundFile(path, "w", SAMPLE_RATE, 1, subtype="PCM_16") as out, \
+                MappedWav(tmp_path) as middle:
+            out.write(np.multiply(looped_head, gain, out=looped_head))
+            for block in middle.blocks(block_size, np.dtype(DTYPE).name):
+                out.write(np.multiply(block, gain, out=block))
+    finally:
+        _STREAM = None
+        os.remove(tmp_path)
+
+    return loop_samples
+
+
+def write_stem(synth_fn, duration_sec: float, rng: np.random.Generator,
+               path: str, stream: bool = False) -> int:
+    """Render a stem into a PCM_16 WAV at path; returns its length in samples."""
+    if stream:
+        return write_stem_streaming(synth_fn, duration_sec, rng, path)
+    audio = generate_stem(synth_fn, duration_sec, rng)
+    with stage("write"):
+        sf.write(path, audio, SAMPLE_RATE, subtype="PCM_16")
+    return len(audio)
+
+
+# ── Synth graphs ───────────────────────────────────────────────────
+#
+# Synths are graphs of the nodes below, loaded from ambient_profiles.json
+# (format and evaluation order: see ambient_graph.py). Each node type wraps
+# one of the building blocks above.
+
+def _render_white_noise(n: int, rng, inputs: list[np.ndarray]) -> np.ndarray:
+    return white_noise(n, rng)
+
+
+def _render_pink_noise(n: int, rng, inputs: list[np.ndarray]) -> np.ndarray:
+    return pink_noise(n, rng)
+
+
+def _render_brown_noise(n: int, rng, inputs: list[np.ndarray]) -> np.ndarray:
+    return brown_noise(n, rng)
+
+
+def _render_oscillators(n: int, rng, inputs: list[np.ndarray], partials: list) -> np.ndarray:
+    # With an input, the bank is added straight into it.
+    return oscillator_bank([tuple(p) for p in partials], n, out=inputs[0] if inputs else None)
+
+
+def _render_sine(n: int, rng, inputs: list[np.ndarray], freq: float, phase: float) -> np.ndarray:
+    return sine_wave(freq, n, phase)
+
+
+def _render_lfo(n: int, rng, inputs: list[np.ndarray], rate: float, phase: float,
+                gain: float, offset: float) -> np.ndarray:
+    return scale(lfo(rate, n, phase), gain, offset)
+
+
+def _render_lowpass(n: int, rng, inputs: list[np.ndarray], cutoff: float, order: int) -> np.ndarray:
+    return lowpass(inputs[0], cutoff, order, out=inputs[0])
+
+
+def _render_highpass(n: int, rng, inputs: list[np.ndarray], cutoff: float, order: int) -> np.ndarray:
+    return highpass(inputs[0], cutoff, order, out=inputs[0])
+
+
+def _render_bandpass(n: int, rng, inputs: list[np.ndarray], low: float, high: float,
+                     order: int) -> np.ndarray:
+    return bandpass(inputs[0], low, high, order, out=inputs[0])
+
+
+def _render_sweep(n: int, rng, inputs: list[np.ndarray], base_cutoff: float, sweep_range: float,
+                  lfo_rate: float) -> np.ndarray:
+    return apply_slow_filter_sweep(inputs[0], base_cutoff, sweep_range, lfo_rate, rng, out=inputs[0])
+
+
+def _render_gain(n: int, rng, inputs: list[np.ndarray], gain: float, offset: float) -> np.ndarray:
+    return scale(inputs[0], gain, offset)
+
+
+def _render_mix(n: int, rng, inputs: list[np.ndarray], gains: list[float] | None) -> np.ndarray:
+    gains = gains or [1.0] * len(inputs)
+    out = inputs[0] if gains[0] == 1.0 else scale(inputs[0], gains[0])
+    for src, gain in zip(inputs[1:], gains[1:]):
+        accumulate(out, src, gain)
+    return out
+
+
+def _render_multiply(n: int, rng, inputs: list[np.ndarray]) -> np.ndarray:
+    out = inputs[0]
+    for src in inputs[1:]:
+        multiply(out, src)
+    return out
+
+
+NODE_TYPES = {
+    "white_noise": NodeType(_render_white_noise, (0, 0), (), {}, True),
+    "pink_noise": NodeType(_render_pink_noise, (0, 0), (), {}, True),
+    "brown_noise": NodeType(_render_brown_noise, (0, 0), (), {}, True),
+    # partials: [[freq, phase, gain] or [freq, gain], ...]; adds into its input if it has one
+    "oscillators": NodeType(_render_oscillators, (0, 1), ("partials",), {}, False),
+    "sine": NodeType(_render_sine, (0, 0), ("freq",), {"phase": 0.0}, False),
+    # sine in [0, 1], then * gain + offset
+    "lfo": NodeType(_render_lfo, (0, 0), ("rate",), {"phase": 0.0, "gain": 1.0, "offset": 0.0}, False),
+    "lowpass": NodeType(_render_lowpass, (1, 1), ("cutoff",), {"order": 4}, False),
+    "highpass": NodeType(_render_highpass, (1, 1), ("cutoff",), {"order": 4}, False),
+    "bandpass": NodeType(_render_bandpass, (1, 1), ("low", "high"), {"order": 4}, False),
+    # apply_slow_filter_sweep(); draws the sweep's phase
+    "sweep": NodeType(_render_sweep, (1, 1), ("base_cutoff", "sweep_range", "lfo_rate"), {}, True),
+    "gain": NodeType(_render_gain, (1, 1), ("gain",), {"offset": 0.0}, False),
+    # sum of inputs * gains (default all 1)
+    "mix": NodeType(_render_mix, (2, None), (), {"gains": None}, False),
+    "multiply": NodeType(_render_multiply, (2, None), (), {}, False),
 }
 
+NODE_CACHE = NodeCache(NODE_CACHE_BYTES)
+
+
+def _node_rng(seed: str):
+    """A seeded node's own generator; kept in a slot across stream blocks."""
+    slot = _stream_slot()
+    if slot is None:
+        return np.random.default_rng(stem_seed(seed))
+    rng = slot.get("rng")
+    if rng is None:
+        rng = slot["rng"] = _StreamRng(np.random.default_rng(stem_seed(seed)))
+    rng.next_draw = 0
+    return rng
+
+
+def render_synth(graph: SynthGraph, n_samples: int, rng: np.random.Generator) -> np.ndarray:
+    """Render graph with this process's dtype and streaming state.
+
+    Pure nodes go through NODE_CACHE, except while streaming, where every
+    block is a different slice of the stem.
+    """
+    cache = NODE_CACHE if _STREAM is None else None
+    return render_graph(graph, n_samples, rng, _node_rng, cache, (np.dtype(DTYPE).name,))
+
+
+# ── Profile definitions ────────────────────────────────────────────
+
+SYNTHS, PROFILES = load_profiles(PROFILES_PATH, NODE_TYPES, SAMPLE_RATE, render_synth)
+
 DURATIONS = [40, 45, 50]  # seconds — vary per variant
 
+# Category of a newly added stem in manifest.json. Like its default title
+# and tags, it is only a starting point: edits made in the manifest stick.
+LAYER_CATEGORIES = {
+    "low_bed": "white_noise",
+    "mid_texture": "other",
+    "mid_presence": "other",
+    "air": "wind",
+    "room": "other",
+}
 
-def main():
-    manifest_stems = []
-    total_files = 0
 
+# ── Render cache ───────────────────────────────────────────────────
+
+_CONSTANT_TYPES = (bool, int, float, str, bytes, tuple)
+
+
+def _function_sources(fn, seen: dict[str, str] | None = None) -> dict[str, str]:
+    """Collect the source of fn and every module-level function it calls.
+
+    Source text alone misses values that change the audio without changing
+    a line of the function: module constants it reads (OSC_ROW) and default
+    arguments bound at definition time (block_size=SWEEP_BLOCK). Both are
+    collected too, as their reprs.
+    """
+    if seen is None:
+        seen = {}
+    if fn.__name__ in seen:
+        return seen
+    seen[fn.__name__] = inspect.getsource(fn)
+    if fn.__defaults__ or fn.__kwdefaults__:
+        seen[f"{fn.__name__}.defaults"] = repr((fn.__defaults__, fn.__kwdefaults__))
+
+    codes = [fn.__code__]
+    while codes:
+        code = codes.pop()
+        codes.extend(c for c in code.co_consts if inspect.iscode(c))
+        for name in code.co_names:
+            obj = fn.__globals__.get(name)
+            if callable(obj):
+                # unwrap() sees through decorators such as lru_cache.
+                obj = inspect.unwrap(obj)
+            if inspect.isfunction(obj) and obj.__module__ == fn.__module__:
+                _function_sources(obj, seen)
+            elif inspect.isclass(obj) and obj.__module__ == fn.__module__:
+                seen.setdefault(obj.__name__, inspect.getsource(obj))
+            elif isinstance(obj, _CONSTANT_TYPES) and name.isupper():
+                seen.setdefault(f"const {name}", repr(obj))
+    return seen
+
+
+@lru_cache(maxsize=1)
+def _engine_digest() -> str:
+    """Hash of the render path's sources, module constants and defaults.
+
+    None of it changes while the process runs, and inspect.getsource()
+    re-parses the module for every class, so it is gathered once rather
+    than for every stem.
+    """
+    sources = _function_sources(write_stem)
+    _function_sources(render_synth, sources)
+    for name, node_type in NODE_TYPES.items():
+        _function_sources(node_type.render, sources)
+        sources[f"node {name}"] = repr(node_type[1:])
+    # How graphs are parsed and evaluated, down to the order of their draws.
+    sources["ambient_graph"] = inspect.getsource(ambient_graph)
+    h = hashlib.sha256()
+    for name in sorted(sources):
+        h.update(sources[name].encode("utf-8"))
+    return h.hexdigest()
+
+
+def stem_cache_key(synth_fn: SynthGraph, duration_sec: float, seed: int, stream: bool = False) -> str:
+    """Content hash of everything that determines a rendered stem's bytes."""
+    h = hashlib.sha256(_engine_digest().encode("utf-8"))
+    # Not sorted: the order nodes and parameters are written in is the
+    # order they draw from the rng.
+    h.update(json.dumps(synth_fn.spec).encode("utf-8"))
+    params = {
+        "synth": synth_fn.__name__,
+        "duration_sec": duration_sec,
+        "seed": seed,
+        "sample_rate": SAMPLE_RATE,
+        "crossfade_sec": CROSSFADE_SEC,
+        "target_peak": TARGET_PEAK,
+        "dtype": np.dtype(DTYPE).name,
+        "subtype": "PCM_16",
+        "stream": stream,
+    }
+    if stream:
+        params.update(stream_block=STREAM_BLOCK, stream_noise_peak=STREAM_NOISE_PEAK,
+                      stream_brown_leak_hz=STREAM_BROWN_LEAK_HZ)
+    h.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _cache_hit(cached: str) -> bool:
+    """Whether cached exists; marks it used, for prune_cache()."""
+    try:
+        os.utime(cached)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def prune_cache(max_bytes: int) -> tuple[int, int]:
+    """Delete least recently used cache files until CACHE_DIR fits max_bytes.
+
+    Every hit bumps the cached file's mtime, so what the last builds used is
+    kept. Returns the (files, bytes) removed.
+    """
+    try:
+        entries = [e for e in os.scandir(CACHE_DIR) if e.is_file()]
+    except FileNotFoundError:
+        return 0, 0
+    stats = {e.path: e.stat() for e in entries}
+    total = sum(s.st_size for s in stats.values())
+    removed = freed = 0
+    for path in sorted(stats, key=lambda p: stats[p].st_mtime):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= stats[path].st_size
+        removed += 1
+        freed += stats[path].st_size
+    return removed, freed
+
+
+def _store_in_cache(src_path: str, key: str, ext: str = "wav") -> None:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    cached = os.path.join(CACHE_DIR, f"{key}.{ext}")
+    # Copy then rename so a concurrent worker never sees a partial file.
+    tmp = f"{cached}.{os.getpid()}.tmp"
+    shutil.copyfile(src_path, tmp)
+    os.replace(tmp, cached)
+
+
+# ── Stem analysis ──────────────────────────────────────────────────
+#
+# Measured once per rendered stem and stored in the manifest, so the app can
+# gain-match layers and schedule crossfades without decoding anything.
+
+def _db(value: float) -> float:
+    with np.errstate(divide="ignore"):
+        return round(max(float(20 * np.log10(value)), SILENCE_DB), 2)
+
+
+def measure_stem(path: str) -> dict:
+    """Loudness, level, RMS envelope and spectral centroid of a rendered stem.
+
+    One pass over the memory-mapped WAV feeds the same EBU R128 meter and
+    spectrum accumulator the QA gates use, with the same float32 blocks, so
+    these are the numbers analyze_audio.py reports for the file.
+    """
+    with MappedWav(path) as wav:
+        sr, n = wav.samplerate, wav.frames
+        meter = LoudnessMeter(sr, wav.channels)
+        spectrum = SpectrumAccumulator(sr)
+        envelope = RmsEnvelope(sr)
+        stem_peak = 0.0
+        for block in wav.blocks(STREAM_BLOCK, "float32"):
+            meter.add(block)
+            mono = block.mean(axis=1)
+            spectrum.add(mono)
+            envelope.add(mono)
+            stem_peak = max(stem_peak, peak(block))
+
+    # min/max come from the 1 s windows analyze_audio.py reports in full;
+    # the manifest, fetched by the app at startup, only gets a coarse curve.
+    levels = envelope.result() or [SILENCE_DB]
+    energy, lengths = envelope.energy, envelope.lengths()
+    groups = np.array_split(np.arange(len(energy)), min(ENVELOPE_POINTS, len(energy))) if len(energy) else []
+    lufs = meter.integrated()
+    return {
+        "lufs_i": round(max(lufs, SILENCE_DB), 2),
+        "peak_dbfs": _db(stem_peak),
+        "rms_db": {
+            "overall": _db(np.sqrt(energy.sum() / max(n, 1))),
+            "min": min(levels),
+            "max": max(levels),
+            "envelope": [_db(np.sqrt(energy[g].sum() / lengths[g].sum())) for g in groups],
+        },
+        "centroid_hz": round(spectrum.result()["centroid"], 1),
+        "loop_samples": n,
+        "sample_rate": sr,
+    }
+
+
+def _analysis(wav_path: str, stem_key: str, force: bool = False) -> dict:
+    """measure_stem(), cached next to the stem's render."""
+    cached = os.path.join(CACHE_DIR, f"{stem_key}.analysis-v{ANALYSIS_VERSION}.json")
+    if not force and _cache_hit(cached):
+        with open(cached) as f:
+            return json.load(f)
+    with stage("analyze"):
+        metrics = measure_stem(wav_path)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = f"{cached}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(metrics, f)
+    os.replace(tmp, cached)
+    return metrics
+
+
+# ── Delivery encodes ───────────────────────────────────────────────
+#
+# The WAVs stay the masters; the app can fetch one of these instead. Each
+# encode is made from the PCM_16 WAV, so it carries exactly the samples that
+# were verified, and is checked for length and seam before it is kept.
+
+ENCODINGS = {
+    # name: (extension, soundfile format, subtype, sample rate or None to keep)
+    "flac": ("flac", "FLAC", "PCM_16", None),
+    "ogg": ("ogg", "OGG", "VORBIS", None),
+    "opus": ("opus", "OGG", "OPUS", 48000),  # Opus has no 44.1 kHz mode
+}
+# Opus is opt-in: libsndfile pads the last Opus frame with silence, which
+# leaves a click in the final few ms, where the loop wraps.
+DEFAULT_FORMATS = "flac,ogg"
+ENCODE_EDGE_SEC = 0.05  # audio at either end of the loop held to the body's error
+
+
+def available_formats(names: list[str]) -> tuple[list[str], list[str]]:
+    """Split names into encodings this libsndfile can write and those it can't."""
+    usable = [n for n in names if sf.check_format(ENCODINGS[n][1], ENCODINGS[n][2])]
+    return usable, [n for n in names if n not in usable]
+
+
+def _loop_blocks(wav: MappedWav, rate: int, block_size: int = STREAM_BLOCK):
+    """The stem's samples block by block, resampled to rate when it differs.
+
+    Resampling treats the stem as one period of a loop: every block is padded
+    with its circular neighbours (the loop's tail before the first block, its
+    head after the last), so the filter sees straight across the seam and the
+    resampled stem loops as cleanly as the original.
+    """
+    samples = wav.data[:, 0]
+    n = wav.frames
+    if rate == wav.samplerate:
+        for start in range(0, n, block_size):
+            yield samples[start:start + block_size]
+        return
+
+    g = math.gcd(rate, wav.samplerate)
+    up, down = rate // g, wav.samplerate // g
+    # resample_poly's filter reaches 10 * max(up, down) / up input samples
+    # either side; pad by whole multiples of down to keep outputs aligned.
+    reach = -(-10 * max(up, down) // up)
+    pad = -(-reach // down) * down
+    step = max(1, block_size // down) * down
+    n_out = n * up // down
+    written = 0
+    for start in range(0, n, step):
+        stop = min(start + step, n)
+        padded = to_float(samples[np.arange(start - pad, stop + pad) % n], "float64")
+        resampled = resample_poly(padded, up, down)
+        count = n_out - written if stop == n else (stop - start) * up // down
+        skip = pad * up // down
+        yield resampled[skip:skip + count]
+        written += count
+
+
+# Ogg pages carry a CRC-32 (poly 0x04C11DB7, MSB-first, no reflection, init
+# and xorout 0). zlib's crc32 is the reflected form of the same polynomial,
+# so bit-reversing every byte in and the result out gives the Ogg CRC.
+_BIT_REVERSED = bytes(int(f"{b:08b}"[::-1], 2) for b in range(256))
+
+
+def _ogg_crc(page: bytes) -> int:
+    data = page.translate(_BIT_REVERSED)
+    # Cancel zlib's 0xFFFFFFFF init and xorout, leaving the raw remainder
+    crc = zlib.crc32(data) ^ zlib.crc32(bytes(len(data)))
+    return int(f"{crc:032b}"[::-1], 2)
+
+
+def _set_ogg_serial(path: str, serial: int) -> None:
+    """Rewrite the stream serial number in every page of the Ogg file at path.
+
+    libsndfile picks a random serial for each encode, and the serial is part
+    of every page header and its CRC, so otherwise the same samples never
+    encode to the same bytes twice.
+    """
+    with open(path, "r+b") as f:
+        data = bytearray(f.read())
+        pos = 0
+        while pos < len(data):
+            if data[pos:pos + 4] != b"OggS":
+                raise ValueError(f"{path}: no Ogg page at byte {pos}")
+            n_segments = data[pos + 26]
+            end = pos + 27 + n_segments + sum(data[pos + 27:pos + 27 + n_segments])
+            data[pos + 14:pos + 18] = serial.to_bytes(4, "little")
+            data[pos + 22:pos + 26] = bytes(4)
+            data[pos + 22:pos + 26] = _ogg_crc(bytes(data[pos:end])).to_bytes(4, "little")
+            pos = end
+        f.seek(0)
+        f.write(data)
+
+
+def encode_stem(wav_path: str, name: str, path: str, serial: int = 0) -> None:
+    """Encode the PCM_16 stem at wav_path to path as ENCODINGS[name].
+
+    Ogg encodes get the stream serial number serial, so they are as
+    reproducible as the WAV they come from.
+    """
+    _, fmt, subtype, rate = ENCODINGS[name]
+    with MappedWav(wav_path) as wav:
+        rate = rate or wav.samplerate
+        with sf.SoundFile(path, "w", rate, wav.channels, format=fmt, subtype=subtype) as out:
+            for block in _loop_blocks(wav, rate):
+                out.write(block)
+    if fmt == "OGG":
+        _set_ogg_serial(path, serial)
+
+
+def _check_encode(wav_path: str, name: str, path: str) -> tuple[bool, str]:
+    """Check an encode against the WAV it was made from.
+
+    Lengths must match (at the encode's rate) and lossless encodes must
+    decode to the WAV's exact samples. A lossy encode may differ everywhere,
+    but its error within ENCODE_EDGE_SEC of either end of the loop must be
+    no larger than anywhere else: codecs that pad their last frame with
+    silence, or start cold, put a click exactly where the loop wraps.
+    """
+    _, _, subtype, rate = ENCODINGS[name]
+    with MappedWav(wav_path) as wav, sf.SoundFile(path) as encoded:
+        rate = rate or wav.samplerate
+        expected = wav.frames * rate // wav.samplerate
+        if encoded.frames != expected:
+            return False, f"{encoded.frames} frames, expected {expected}"
+
+        edge = min(int(ENCODE_EDGE_SEC * rate), expected // 2)
+        edge_error = body_error = 0.0
+        start = 0
+        for ref in _loop_blocks(wav, rate):
+            if ref.dtype.kind == "i":
+                ref = to_float(ref, "float64")
+            error = np.abs(encoded.read(len(ref), dtype="float64") - ref)
+            at = np.arange(start, start + len(ref))
+            near_seam = (at < edge) | (at >= expected - edge)
+            if near_seam.any():
+                edge_error = max(edge_error, float(error[near_seam].max()))
+            if not near_seam.all():
+                body_error = max(body_error, float(error[~near_seam].max()))
+            start += len(ref)
+
+    if subtype.startswith("PCM"):
+        return edge_error == body_error == 0.0, f"max error {max(edge_error, body_error):.6f}"
+    ok = edge_error <= max(body_error, 1.0 / 32768)
+    return ok, f"max error {edge_error:.4f} at the loop point, {body_error:.4f} elsewhere"
+
+
+@lru_cache(maxsize=1)
+def _encoder_digest() -> str:
+    """Hash of the encode code path and the libsndfile doing the encoding."""
+    sources = _function_sources(encode_stem)
+    h = hashlib.sha256(sf.__libsndfile_version__.encode("utf-8"))
+    for name in sorted(sources):
+        h.update(sources[name].encode("utf-8"))
+    return h.hexdigest()
+
+
+def encode_cache_key(stem_key: str, name: str) -> str:
+    material = json.dumps([stem_key, _encoder_digest(), ENCODINGS[name]])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _encode_outputs(wav_path: str, rel_path: str, stem_key: str, formats: list[str],
+                    force: bool = False) -> tuple[dict, list[str]]:
+    """Write (or restore from cache) each encode of a stem next to its WAV.
+
+    Returns the manifest's encodings dict and a description of every encode
+    that failed its check. Failed encodes are left on disk for inspection but
+    never cached.
+    """
+    encodings, problems = {}, []
+    for name in formats:
+        ext, _, _, rate = ENCODINGS[name]
+        path = f"{os.path.splitext(wav_path)[0]}.{ext}"
+        key = encode_cache_key(stem_key, name)
+        cached = os.path.join(CACHE_DIR, f"{key}.{ext}")
+        if not force and _cache_hit(cached):
+            shutil.copyfile(cached, path)
+        else:
+            with stage(f"encode_{name}"):
+                encode_stem(wav_path, name, path, serial=int(stem_key[:8], 16))
+            ok, msg = _check_encode(wav_path, name, path)
+            if not ok:
+                problems.append(f"{name}: {msg}")
+                continue
+            _store_in_cache(path, key, ext)
+
+        info = sf.info(path)
+        encodings[name] = {
+            "path": f"/audio/ambient/{os.path.splitext(rel_path)[0]}.{ext}",
+            "bytes": os.path.getsize(path),
+            "duration_sec": round(info.frames / info.samplerate, 3),
+            "sample_rate": info.samplerate,
+        }
+    return encodings, problems
+
+
+# ── Build ──────────────────────────────────────────────────────────
+
+def stem_seed(stem_id: str, global_seed: int | None = None) -> int:
+    """Stable 32-bit seed for a stem, identical across processes and runs.
+
+    Uses a SHA-256 digest rather than hash(), which Python randomizes per
+    process unless PYTHONHASHSEED is set.
+    """
+    material = stem_id if global_seed is None else f"{global_seed}:{stem_id}"
+    digest = hashlib.sha256(material.encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "little")
+
+
+def _stem_target(task: tuple[str, str, int, int], duration: float | None = None) -> dict:
+    """Resolve a task to its synth graph, duration and output location.
+
+    duration overrides the per-variant DURATIONS entry when given.
+    """
+    profile_id, layer_name, variant_idx, seed = task
+    profile_def = PROFILES[profile_id]
+    mode = profile_def["mode"]
+    stem_id = f"{profile_id}_{layer_name}_{variant_idx + 1:02d}"
+    rel_dir = os.path.join(mode, profile_id, layer_name)
+    filename = f"{stem_id}.wav"
+    return {
+        "stem_id": stem_id,
+        "variant": variant_idx + 1,
+        "mode": mode,
+        "profile": profile_id,
+        "layer": layer_name,
+        "synth_fn": profile_def["layers"][layer_name][variant_idx],
+        "duration": duration or DURATIONS[variant_idx % len(DURATIONS)],
+        "seed": seed,
+        "rel_path": f"{rel_dir}/{filename}".replace("\\", "/"),
+        "out_path": os.path.join(BASE_DIR, rel_dir, filename),
+    }
+
+
+def _track_defaults(target: dict) -> dict:
+    """Title, category and tags for a stem the manifest doesn't list yet."""
+    profile_words = target["profile"].split("_")
+    layer_words = target["layer"].split("_")
+    return {
+        "title": " ".join(w.title() for w in profile_words[1:] + layer_words) + f" {target['variant']}",
+        "category": LAYER_CATEGORIES.get(target["layer"], "other"),
+        "tags": list(dict.fromkeys([*layer_words, *profile_words[1:], target["mode"]])),
+    }
+
+
+def _render_stem(task: tuple[str, str, int, int], force: bool = False, stream: bool = False,
+                 duration: float | None = None, formats: tuple[str, ...] = ()
+                 ) -> tuple[dict, bool, tuple[int, int, int, int], list[str]]:
+    """Render (or restore from cache) and write one stem and its encodes.
+
+    Returns its manifest entry, whether it was a render-cache hit, the
+    (hits, misses) design_sos() and then NODE_CACHE saw while rendering it,
+    and any encode that failed its check. Runs inside a
+    worker process when --jobs > 1, so it only takes picklable arguments and
+    looks the synth graph up in PROFILES itself.
+    """
+    target = _stem_target(task, duration)
+    stem_id = target["stem_id"]
+    duration = target["duration"]
+    out_path = target["out_path"]
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+
+    key = stem_cache_key(target["synth_fn"], duration, target["seed"], stream)
+    cached = os.path.join(CACHE_DIR, f"{key}.wav")
+    hit = not force and _cache_hit(cached)
+    designs_before = design_sos.cache_info()
+    nodes_before = (NODE_CACHE.hits, NODE_CACHE.misses)
+
+    if hit:
+        print(f"  Cached     {stem_id} ({duration}s)", flush=True)
+        shutil.copyfile(cached, out_path)
+        n_samples = sf.info(out_path).frames
+    else:
+        print(f"  Generating {stem_id} ({duration}s)...", flush=True)
+        if _PROFILE is not None:
+            _PROFILE.begin_stem(stem_id)
+        rng = np.random.default_rng(target["seed"])
+        n_samples = write_stem(target["synth_fn"], duration, rng, out_path, stream)
+        _store_in_cache(out_path, key)
+
+    entry = {
+        "id": stem_id,
+        **_track_defaults(target),
+        "path": f"/audio/ambient/{target['rel_path']}",
+        "duration_sec": round(n_samples / SAMPLE_RATE, 3),
+        **_analysis(out_path, key, force),
+        "bytes": os.path.getsize(out_path),
+    }
+    encodings, problems = _encode_outputs(out_path, target["rel_path"], key, list(formats), force)
+    if formats:
+        entry["encodings"] = encodings
+    designs = design_sos.cache_info()
+    cache_stats = (designs.hits - designs_before.hits, designs.misses - designs_before.misses,
+                   NODE_CACHE.hits - nodes_before[0], NODE_CACHE.misses - nodes_before[1])
+    return entry, hit, cache_stats, [f"{stem_id} {p}" for p in problems]
+
+
+def _verify_stem(task: tuple[str, str, int, int], stream: bool = False,
+                 duration: float | None = None) -> tuple[str, bool, str]:
+    """Re-render one stem to a scratch file and compare it with the WAV on disk."""
+    target = _stem_target(task, duration)
+    out_path = target["out_path"]
+    if not os.path.exists(out_path):
+        return target["stem_id"], False, "missing on disk"
+
+    with tempfile.TemporaryDirectory() as scratch:
+        scratch_path = os.path.join(scratch, "stem.wav")
+        rng = np.random.default_rng(target["seed"])
+        write_stem(target["synth_fn"], target["duration"], rng, scratch_path, stream)
+        with open(scratch_path, "rb") as f:
+            rendered_bytes = f.read()
+        with open(out_path, "rb") as f:
+            on_disk = f.read()
+        if rendered_bytes == on_disk:
+            return target["stem_id"], True, "bit-exact"
+
+        # Compare the mapped PCM in place; no decoded copies of either file.
+        with MappedWav(scratch_path) as rendered, MappedWav(out_path) as existing:
+            if rendered.data.shape != existing.data.shape:
+                return target["stem_id"], False, f"length {rendered.frames} != {existing.frames} samples"
+            n_diff = int(np.count_nonzero(rendered.data != existing.data))
+            return target["stem_id"], False, f"{n_diff} of {existing.frames} samples differ"
+
+
+def _check_seam_stem(task: tuple[str, str, int, int], duration: float | None = None) -> tuple[str, bool, str]:
+    """Run the seam gate on one stem's WAV on disk."""
+    target = _stem_target(task, duration)
+    if not os.path.exists(target["out_path"]):
+        return target["stem_id"], False, "missing on disk"
+    metrics = seam.measure_file(target["out_path"])
+    ok, msg, _ = check_seam(metrics)
+    if ok and metrics:
+        msg = (f"discontinuity {metrics['discontinuity']:.2f}x, dip {metrics['dip_db']:.1f} dB, "
+               f"flux {metrics['flux']:.2f}x")
+    return target["stem_id"], ok, msg
+
+
+def _encode_pcm16(audio: np.ndarray) -> np.ndarray:
+    """Round-trip audio through a PCM_16 WAV exactly as sf.write stores it."""
+    buf = io.BytesIO()
+    sf.write(buf, audio, SAMPLE_RATE, format="WAV", subtype="PCM_16")
+    buf.seek(0)
+    pcm, _ = sf.read(buf, dtype="int16")
+    return pcm
+
+
+def _check_dtype_stem(task: tuple[str, str, int, int]) -> tuple[str, bool, str]:
+    """Render one stem in float64 and float32 and compare the PCM_16 output."""
+    target = _stem_target(task)
+    current = np.dtype(DTYPE).name
+    rendered = {}
+    try:
+        for name in ("float64", "float32"):
+            set_dtype(name)
+            rng = np.random.default_rng(target["seed"])
+            audio = generate_stem(target["synth_fn"], target["duration"], rng)
+            rendered[name] = _encode_pcm16(audio).astype(np.int64)
+    finally:
+        set_dtype(current)
+
+    diff = rendered["float64"] - rendered["float32"]
+    rms = float(np.sqrt(np.mean(diff.astype(np.float64) ** 2)))
+    msg = f"{rms:.3f} LSB RMS, max {int(np.abs(diff).max())} LSB"
+    return target["stem_id"], rms < 1.0, msg
+
+
+def build_tasks(global_seed: int | None = None) -> list[tuple[str, str, int, int]]:
+    """List every (profile, layer, variant, seed) to render, in manifest order."""
+    tasks = []
     for profile_id, profile_def in PROFILES.items():
-        mode = profile_def["mode"]
-        layers = profile_def["layers"]
-
-        for layer_name, synth_fns in layers.items():
-            for variant_idx, synth_fn in enumerate(synth_fns):
-                variant_num = variant_idx + 1
-                stem_id = f"{profile_id}_{layer_name}_{variant_num:02d}"
-                duration = DURATIONS[variant_idx % len(DURATIONS)]
-
-                # Deterministic but unique seed per stem
-                seed = hash(stem_id) & 0xFFFFFFFF
-                rng = np.random.default_rng(seed)
-
-                print(f"  Generating {stem_id} ({duration}s)...")
-                audio = generate_stem(synth_fn, duration, rng)
-
-                # Build output path
-                rel_dir = os.path.join(mode, profile_id, layer_name)
-                out_dir = os.path.join(BASE_DIR, rel_dir)
-                os.makedirs(out_dir, exist_ok=True)
-
-                filename = f"{stem_id}.wav"
-                out_path = os.path.join(out_dir, filename)
-                sf.write(out_path, audio, SAMPLE_RATE, subtype="PCM_16")
-
-                manifest_stems.append({
-                    "id": stem_id,
-                    "mode": mode,
-                    "profile": profile_id,
-                    "layer": layer_name,
-                    "path": f"/audio/ambient/{rel_dir}/{filename}".replace("\\", "/"),
-                    "length_sec": round(len(audio) / SAMPLE_RATE, 1),
-                    "lufs_i": -32,
-                })
-                total_files += 1
-
-    # Write manifest
-    manifest = {"version": 2, "stems": manifest_stems}
+        for layer_name, synth_fns in profile_def["layers"].items():
+            for variant_idx in range(len(synth_fns)):
+                stem_id = f"{profile_id}_{layer_name}_{variant_idx + 1:02d}"
+                seed = stem_seed(stem_id, global_seed)
+                tasks.append((profile_id, layer_name, variant_idx, seed))
+    return tasks
+
+
+def _run_tasks(fn, tasks: list, jobs: int) -> list:
+    if jobs == 1:
+        return [fn(task) for task in tasks]
+    print(f"Running {len(tasks)} stems on {jobs} workers...")
+    # Workers may be spawned rather than forked, so hand them the dtype.
+    with ProcessPoolExecutor(max_workers=jobs, initializer=set_dtype,
+                             initargs=(np.dtype(DTYPE).name,)) as pool:
+        # map() yields in submission order, so results (and the manifest)
+        # are stable regardless of which worker finishes first.
+        return list(pool.map(fn, tasks))
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate seamless-looping ambient stems.")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="worker processes to render with (0 = one per CPU, default 1); "
+                             "output is identical whatever the count")
+    parser.add_argument("--force", action="store_true",
+                        help="ignore the render cache and re-synthesize every stem")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="global seed mixed into every stem's seed")
+    parser.add_argument("--verify", action="store_true",
+                        help="re-render and check stems are bit-exact with the files on disk; "
+                             "writes nothing")
+    parser.add_argument("--check-seams", action="store_true",
+                        help="check every stem on disk loops without a click, dip or spectral jump")
+    parser.add_argument("--dtype", choices=("float64", "float32"), default="float64",
+                        help="synthesis dtype (default float64); float32 halves buffer memory")
+    parser.add_argument("--check-dtype", action="store_true",
+                        help="check float32 renders stay within 1 LSB RMS of float64")
+    parser.add_argument("--stream", action="store_true",
+                        help="synthesize block by block straight into the WAV, with constant memory "
+                             "however long the stem")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="render every stem at this many seconds instead of DURATIONS")
+    parser.add_argument("--formats", default=DEFAULT_FORMATS,
+                        help=f"comma-separated delivery encodes to write next to each WAV, "
+                             f"from {', '.join(ENCODINGS)}; empty for WAV only (default {DEFAULT_FORMATS}). "
+                             f"Encodes libsndfile can't write are skipped; one that fails its length "
+                             f"or seam check is left out of the manifest and the run exits 1")
+    parser.add_argument("--cache-max-mb", type=float, default=CACHE_MAX_MB,
+                        help=f"prune the render cache to this size after a build, least recently "
+                             f"used first (default {CACHE_MAX_MB})")
+    parser.add_argument("--profile", action="store_true",
+                        help="print per-stage timings/allocations per stem and save a cProfile dump; "
+                             "implies --force and --jobs 1, and writes stems to a scratch directory, "
+                             "leaving public/ and the manifest alone")
+    parser.add_argument("--profile-out", default="stem_profile.pstats",
+                        help="where --profile saves the cProfile dump (default stem_profile.pstats)")
+    return parser.parse_args(argv)
+
+
+def _profile_run(fn, tasks: list, out_path: str) -> list:
+    """Run tasks serially under cProfile and the stage profiler, then report."""
+    global _PROFILE
+
+    _PROFILE = StageProfiler()
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    try:
+        results = profiler.runcall(lambda: [fn(task) for task in tasks])
+    finally:
+        tracemalloc.stop()
+        stages, _PROFILE = _PROFILE, None
+
+    print(stages.report())
+    profiler.dump_stats(out_path)
+    print(f"\nTop functions by cumulative time (full dump: python -m pstats {out_path}):")
+    pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+    return results
+
+
+def main(argv: list[str] | None = None) -> int:
+    global BASE_DIR
+
+    args = parse_args(argv)
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    set_dtype(args.dtype)
+    tasks = build_tasks(args.seed)
+
+    if args.check_dtype and (args.stream or args.duration):
+        print("--check-dtype compares in-memory renders; it can't be combined with --stream or --duration")
+        return 2
+
+    if args.verify:
+        check_fn = partial(_verify_stem, stream=args.stream, duration=args.duration)
+    elif args.check_seams:
+        check_fn = partial(_check_seam_stem, duration=args.duration)
+    elif args.check_dtype:
+        check_fn = _check_dtype_stem
+    else:
+        check_fn = None
+    if check_fn is not None:
+        failed = False
+        for stem_id, ok, msg in _run_tasks(check_fn, tasks, jobs):
+            status = "OK" if ok else "FAIL"
+            print(f"{status:4} {stem_id}: {msg}")
+            failed = failed or not ok
+        return 1 if failed else 0
+
+    requested = [name.strip() for name in args.formats.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in ENCODINGS]
+    if unknown:
+        print(f"Unknown --formats: {', '.join(unknown)} (choose from {', '.join(ENCODINGS)})")
+        return 2
+    formats, unsupported = available_formats(requested)
+    if "flac" in unsupported:
+        print(f"libsndfile {sf.__libsndfile_version__} cannot write FLAC")
+        return 2
+    for name in unsupported:
+        print(f"Skipping {name}: not supported by libsndfile {sf.__libsndfile_version__}")
+
+    if args.profile:
+        # Cache hits have nothing to profile, and stages are only recorded in
+        # this process. Stems go to a scratch directory: a profiling run
+        # (often with --duration) must not replace the shipped files.
+        render = partial(_render_stem, force=True, stream=args.stream, duration=args.duration,
+                         formats=tuple(formats))
+        shipped_dir = BASE_DIR
+        with tempfile.TemporaryDirectory(prefix="stem_profile_") as scratch:
+            BASE_DIR = scratch
+            try:
+                results = _profile_run(render, tasks, args.profile_out)
+            finally:
+                BASE_DIR = shipped_dir
+    else:
+        render = partial(_render_stem, force=args.force, stream=args.stream, duration=args.duration,
+                         formats=tuple(formats))
+        results = _run_tasks(render, tasks, jobs)
+    tracks = [entry for entry, _, _, _ in results]
+    hits = sum(1 for _, hit, _, _ in results if hit)
+    design_hits, design_misses, node_hits, node_misses = (
+        sum(stats[i] for _, _, stats, _ in results) for i in range(4))
+    problems = [p for _, _, _, stem_problems in results for p in stem_problems]
+
+    # Merge into the manifest; hand-edited fields and other tracks survive.
     manifest_path = os.path.join(BASE_DIR, "manifest.json")
-    with open(manifest_path, "w") as f:
-        json.dump(manifest, f, indent=2)
-
-    print(f"\nDone! Generated {total_files} stems.")
-    print(f"Manifest: {manifest_path}")
+    if not args.profile:
+        added, updated = ambient_manifest.update(manifest_path, tracks)
+
+    print(f"\nDone! Generated {len(tracks)} stems.")
+    pruned, freed = prune_cache(int(args.cache_max_mb * 1e6))
+    print(f"Cache: {hits} hits, {len(results) - hits} misses"
+          + (f"; pruned {pruned} files ({freed / 1e6:.1f} MB)" if pruned else ""))
+    print(f"Filter designs: {design_hits} hits, {design_misses} misses")
+    print(f"Shared graph nodes: {node_hits} hits, {node_misses} misses")
+    wav_bytes = sum(entry["bytes"] for entry in tracks)
+    sizes = [f"wav {wav_bytes / 1e6:.1f} MB"]
+    for name in formats:
+        size = sum(e["encodings"][name]["bytes"] for e in tracks if name in e["encodings"])
+        sizes.append(f"{name} {size / 1e6:.1f} MB ({wav_bytes / max(size, 1):.1f}x smaller)")
+    print(f"Payload: {', '.join(sizes)}")
+    if args.profile:
+        print("Manifest: not updated (--profile renders into a scratch directory)")
+    else:
+        print(f"Manifest: {manifest_path} ({added} added, {updated} updated)")
+    for problem in problems:
+        print(f"FAIL {problem}")
+    return 1 if problems else 0
 
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())
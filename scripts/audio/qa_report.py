@@ -0,0 +1,113 @@
+"""Machine-readable reports for the audio QA gates.
+
+analyze_audio.run() collects one record per file (verdict, metrics and
+timings per gate) and hands them here to be written as JSON or JUnit XML, so
+loudness/centroid drift in the assets and slowdowns in the gates themselves
+can be tracked across builds without scraping the OK/FAIL lines.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+REPORT_VERSION = 1
+SLOWEST_FILES = 5
+
+
+def _file_sec(record: dict) -> float:
+    return (record["decode_sec"] or 0.0) + (record["analysis_sec"] or 0.0)
+
+
+def build_report(records: list[dict], gates: tuple[str, ...], wall_sec: float) -> dict:
+    """Report dict: per-file records plus a summary block.
+
+    Each record holds path, ok, decode_sec and analysis_sec (None when every
+    gate came from the cache), rms_envelope_db (the file's RMS level per
+    1 s window in dB; None unless it was metered natively this run) and a
+    gates dict of {ok, message, metrics, cached}.
+    """
+    analyzed = [r for r in records if r["analysis_sec"] is not None]
+    slowest = sorted(analyzed, key=_file_sec, reverse=True)[:SLOWEST_FILES]
+    summary = {
+        "files": len(records),
+        "failed": sum(1 for r in records if not r["ok"]),
+        "analyzed": len(analyzed),
+        "cached": len(records) - len(analyzed),
+        "wall_sec": round(wall_sec, 3),
+        "decode_sec": round(sum(r["decode_sec"] for r in analyzed), 3) if analyzed else 0.0,
+        "analysis_sec": round(sum(r["analysis_sec"] for r in analyzed), 3) if analyzed else 0.0,
+        "slowest": [{"path": r["path"], "sec": round(_file_sec(r), 3)} for r in slowest],
+    }
+    return {"version": REPORT_VERSION, "gates": list(gates), "summary": summary, "files": records}
+
+
+def _finite(value):
+    """value with every NaN or infinity (e.g. the LUFS of a silent file) as None.
+
+    JSON has no such numbers: json.dump would write -Infinity, which
+    JSON.parse rejects.
+    """
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k: _finite(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(v) for v in value]
+    return value
+
+
+def write_json(report: dict, path: Path) -> None:
+    with open(path, "w") as f:
+        json.dump(_finite(report), f, indent=2, allow_nan=False)
+        f.write("\n")
+
+
+def write_junit(report: dict, path: Path) -> None:
+    """One <testcase> per file; its gates' metrics become <property> entries.
+
+    Only the scalar fields are written: rms_envelope_db is left to the JSON
+    report, as JUnit properties hold single values.
+    """
+    summary = report["summary"]
+    suite = ET.Element("testsuite", {
+        "name": "audio-qa",
+        "tests": str(summary["files"]),
+        "failures": str(summary["failed"]),
+        "time": f"{summary['wall_sec']:.3f}",
+    })
+    for record in report["files"]:
+        parent, _, name = record["path"].rpartition("/")
+        case = ET.SubElement(suite, "testcase", {
+            "classname": parent.strip("/").replace("/", "."),
+            "name": name,
+            "time": f"{_file_sec(record):.3f}",
+        })
+        props = ET.SubElement(case, "properties")
+        for gate, result in record["gates"].items():
+            ET.SubElement(props, "property", {"name": f"{gate}.cached", "value": str(result["cached"]).lower()})
+            for metric, value in _finite(result["metrics"]).items():
+                ET.SubElement(props, "property", {"name": f"{gate}.{metric}",
+                                                  "value": "null" if value is None else str(value)})
+        problems = [f"{gate}: {r['message']}" for gate, r in record["gates"].items() if not r["ok"]]
+        if problems:
+            failure = ET.SubElement(case, "failure", {"message": "; ".join(problems)})
+            failure.text = "\n".join(problems)
+
+    tree = ET.ElementTree(ET.Element("testsuites"))
+    tree.getroot().append(suite)
+    ET.indent(tree)
+    tree.write(path, encoding="utf-8", xml_declaration=True)
+
+
+REPORT_FORMATS = {"json": (write_json, ".json"), "junit": (write_junit, ".xml")}
+
+
+def write_report(report: dict, fmt: str, path: str | None = None) -> Path:
+    """Write report in fmt to path (default: audio-qa-report.<ext>); returns the path."""
+    writer, ext = REPORT_FORMATS[fmt]
+    out = Path(path) if path else Path(f"audio-qa-report{ext}")
+    writer(report, out)
+    return out
@@ -0,0 +1,152 @@
+"""Loop-seam analysis for ambient stems.
+
+The app plays every stem with looping on, so playback runs from the last
+sample straight back into the first. This measures that wrap-around point
+against the audio either side of it:
+
+  - discontinuity: the second difference (x[n] - 2 x[n-1] + x[n-2]) across
+    the seam over the 99.9th percentile of those around it (floor: 1 LSB at
+    16 bit). A click is a step the local curvature can't explain, whatever
+    the stem's level or spectrum.
+  - dip: the quietest 50 ms frame within 0.5 s of the seam against the 5th
+    percentile of the frames further out, in dB, with both levels floored
+    at -120 dB. Beating and slow LFOs dip everywhere and cancel out; a fade
+    at the loop point does not.
+  - flux: the largest change in magnitude spectrum between STFT frames that
+    straddle the seam over the 95th percentile of the changes elsewhere.
+
+Only WINDOW_SEC at each end of a file is looked at. SeamAccumulator keeps
+just those while blocks stream past, so it runs in the QA gates' single pass.
+
+Usage:
+  python scripts/audio/seam.py public/audio/ambient/some_stem.wav
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from analyze_audio import HOP_LENGTH, N_FFT, SILENCE_DB
+from wavfile import iter_blocks
+
+WINDOW_SEC = 2.0  # audio analyzed on each side of the seam
+ZONE_SEC = 0.5  # frames this close to the seam are "at" it for the dip
+RMS_FRAME_SEC = 0.05
+RMS_HOP_SEC = 0.01
+DISCONTINUITY_PERCENTILE = 99.9
+DIP_PERCENTILE = 5.0
+FLUX_PERCENTILE = 95.0
+LSB = 1.0 / 32768  # 16-bit quantization step; the floor for the click reference
+
+
+def _discontinuity(x: np.ndarray, seam: int) -> float:
+    curvature = np.abs(x[2:] - 2.0 * x[1:-1] + x[:-2])  # [k] is centered on x[k + 1]
+    across = [seam - 2, seam - 1]  # the two that span x[seam - 1] -> x[seam]
+    around = np.delete(curvature, across)
+    reference = max(float(np.percentile(around, DISCONTINUITY_PERCENTILE)), LSB)
+    return float(curvature[across].max()) / reference
+
+
+def _dip_db(x: np.ndarray, seam: int, sr: int) -> float:
+    frame, hop = int(RMS_FRAME_SEC * sr), int(RMS_HOP_SEC * sr)
+    c = np.concatenate(([0.0], np.cumsum(x * x)))
+    starts = np.arange(0, len(x) - frame + 1, hop)
+    energy = (c[starts + frame] - c[starts]) / frame
+    near = np.abs(starts + frame / 2 - seam) <= ZONE_SEC * sr
+    # Levels are floored at SILENCE_DB, so digital silence reads as -120 dB
+    # rather than thousands of dB below the reference.
+    floor = 10.0 ** (SILENCE_DB / 10.0)
+    quietest = max(float(energy[near].min()), floor)
+    reference = max(float(np.percentile(energy[~near], DIP_PERCENTILE)), floor)
+    return float(10.0 * np.log10(quietest / reference))
+
+
+def _flux(x: np.ndarray, seam: int) -> float:
+    window = 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(N_FFT) / N_FFT)
+    S = np.abs(np.fft.rfft(sliding_window_view(x, N_FFT)[::HOP_LENGTH] * window, axis=1))
+    norms = np.linalg.norm(S, axis=1)
+    change = np.linalg.norm(S[1:] - S[:-1], axis=1) / (norms[1:] + norms[:-1] + np.finfo(np.float64).tiny)
+    starts = np.arange(len(S)) * HOP_LENGTH
+    straddles = (starts < seam) & (starts + N_FFT > seam)
+    at_seam = straddles[1:] | straddles[:-1]  # change[t] compares frames t and t + 1
+    reference = float(np.percentile(change[~at_seam], FLUX_PERCENTILE))
+    return float(change[at_seam].max()) / reference if reference > 0 else 0.0
+
+
+def min_window(sr: int) -> int:
+    """Fewest samples per side analyze_seam() can work with."""
+    return int(2 * ZONE_SEC * sr) + N_FFT
+
+
+def analyze_seam(tail: np.ndarray, head: np.ndarray, sr: int) -> dict[str, float]:
+    """Seam metrics for a loop whose last samples are tail and first are head.
+
+    tail and head are mono and equally long, at least min_window(sr).
+    """
+    x = np.concatenate((tail, head)).astype(np.float64, copy=False)
+    seam = len(tail)
+    return {
+        "discontinuity": _discontinuity(x, seam),
+        "dip_db": _dip_db(x, seam, sr),
+        "flux": _flux(x, seam),
+    }
+
+
+class SeamAccumulator:
+    """Keep the first and last WINDOW_SEC of a stream of mono blocks."""
+
+    def __init__(self, sr: int, window_sec: float = WINDOW_SEC):
+        self.sr = sr
+        self.window = int(window_sec * sr)
+        self._head: list[np.ndarray] = []
+        self._head_len = 0
+        self._tail = np.zeros(0, dtype=np.float32)
+        self._samples = 0
+
+    def add(self, y: np.ndarray) -> None:
+        self._samples += len(y)
+        if self._head_len < self.window:
+            part = y[:self.window - self._head_len].copy()
+            self._head.append(part)
+            self._head_len += len(part)
+        self._tail = np.concatenate((self._tail, y))[-self.window:]
+
+    def result(self) -> dict[str, float] | None:
+        """Seam metrics, or None when the stream is too short to judge."""
+        window = min(self.window, self._samples // 2)
+        if window < min_window(self.sr):
+            return None
+        head = np.concatenate(self._head)[:window]
+        return analyze_seam(self._tail[-window:], head, self.sr)
+
+
+def measure_file(path: Path) -> dict[str, float] | None:
+    sr, _, blocks = iter_blocks(path)
+    seam = SeamAccumulator(sr)
+    for block in blocks:
+        # Downmix exactly as the spectrum gate does.
+        seam.add(block.mean(axis=1))
+    return seam.result()
+
+
+def main(paths: list[str]) -> int:
+    for p in paths:
+        r = measure_file(Path(p))
+        if r is None:
+            print(f"{p}: too short to analyze")
+            continue
+        print(f"{p}: discontinuity {r['discontinuity']:.2f}x, dip {r['dip_db']:.1f} dB, "
+              f"flux {r['flux']:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python scripts/audio/seam.py file.wav [file.wav ...]")
+        raise SystemExit(2)
+
+    raise SystemExit(main(sys.argv[1:]))
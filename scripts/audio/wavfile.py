@@ -0,0 +1,133 @@
+"""Zero-copy WAV reader for the audio tooling.
+
+Parses the RIFF header and memory-maps the data chunk, so a file's samples
+are a read-only NumPy view backed by the OS page cache rather than a decoded
+copy. Samples are only converted to float a block at a time. Gates that run
+back to back over the same stems then share the cached pages instead of each
+decoding the whole file again.
+
+Covers the layouts our tooling writes: 16/32-bit PCM and 32/64-bit float,
+plain or WAVE_FORMAT_EXTENSIBLE. Anything else raises UnsupportedWav; use
+iter_blocks() to fall back to soundfile transparently.
+"""
+
+from __future__ import annotations
+
+import os
+import struct
+from collections.abc import Iterator
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+BLOCK_SIZE = 65536  # frames per converted block
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# (format tag, bits per sample) -> little-endian sample dtype
+_SAMPLE_DTYPES = {
+    (WAVE_FORMAT_PCM, 16): "<i2",
+    (WAVE_FORMAT_PCM, 32): "<i4",
+    (WAVE_FORMAT_IEEE_FLOAT, 32): "<f4",
+    (WAVE_FORMAT_IEEE_FLOAT, 64): "<f8",
+}
+
+
+class UnsupportedWav(ValueError):
+    """The file is not a WAV layout MappedWav can map directly."""
+
+
+def to_float(raw: np.ndarray, dtype: str = "float32") -> np.ndarray:
+    """Convert raw samples to a new float array, scaled as soundfile does."""
+    out = raw.astype(dtype)
+    if raw.dtype.kind == "i":
+        out *= 1.0 / (1 << (8 * raw.dtype.itemsize - 1))
+    return out
+
+
+class MappedWav:
+    """A WAV file's data chunk as a (frames, channels) memory-mapped array."""
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            header = f.read(12)
+            if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+                raise UnsupportedWav(f"{self.path}: not a RIFF/WAVE file")
+
+            fmt = None
+            while True:
+                chunk = f.read(8)
+                if len(chunk) < 8:
+                    raise UnsupportedWav(f"{self.path}: no data chunk")
+                chunk_id, size = struct.unpack("<4sI", chunk)
+                if chunk_id == b"fmt ":
+                    fmt = f.read(size)
+                    if size % 2:
+                        f.seek(1, os.SEEK_CUR)
+                elif chunk_id == b"data":
+                    offset = f.tell()
+                    break
+                else:
+                    f.seek(size + size % 2, os.SEEK_CUR)
+
+        if fmt is None or len(fmt) < 16:
+            raise UnsupportedWav(f"{self.path}: missing fmt chunk")
+        tag, channels, samplerate, _, block_align, bits = struct.unpack("<HHIIHH", fmt[:16])
+        if tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+            # The first two bytes of the SubFormat GUID hold the real tag.
+            tag = struct.unpack("<H", fmt[24:26])[0]
+        sample_dtype = _SAMPLE_DTYPES.get((tag, bits))
+        if sample_dtype is None or block_align != channels * bits // 8:
+            raise UnsupportedWav(f"{self.path}: unsupported format (tag {tag:#x}, {bits}-bit)")
+
+        self.samplerate = samplerate
+        self.channels = channels
+        # Streamed writers may leave a placeholder size; trust the file length.
+        available = os.path.getsize(self.path) - offset
+        self.frames = min(size, available) // block_align
+        if self.frames:
+            self.data = np.memmap(self.path, dtype=sample_dtype, mode="r", offset=offset,
+                                  shape=(self.frames, channels))
+        else:
+            self.data = np.empty((0, channels), dtype=sample_dtype)
+
+    def blocks(self, blocksize: int = BLOCK_SIZE, dtype: str = "float32") -> Iterator[np.ndarray]:
+        """(frames, channels) float blocks, each a fresh writable array."""
+        for start in range(0, self.frames, blocksize):
+            yield to_float(self.data[start:start + blocksize], dtype)
+
+    def close(self) -> None:
+        # Drop our reference so the mapping is released as soon as no view of
+        # it is left, and the file can be deleted or replaced (Windows).
+        self.data = np.empty((0, self.channels), dtype=self.data.dtype)
+
+    def __enter__(self) -> MappedWav:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def iter_blocks(path: str | os.PathLike, blocksize: int = BLOCK_SIZE,
+                dtype: str = "float32") -> tuple[int, int, Iterator[np.ndarray]]:
+    """(samplerate, channels, blocks) for any audio file soundfile can read.
+
+    WAVs are memory-mapped; other formats and layouts are decoded by
+    soundfile. Blocks are always (frames, channels).
+    """
+    try:
+        wav = MappedWav(path)
+    except UnsupportedWav:
+        info = sf.info(str(path))
+        blocks = sf.blocks(str(path), blocksize=blocksize, dtype=dtype, always_2d=True)
+        return info.samplerate, info.channels, blocks
+
+    def mapped() -> Iterator[np.ndarray]:
+        with wav:
+            yield from wav.blocks(blocksize, dtype)
+
+    return wav.samplerate, wav.channels, mapped()